@@ -1,3 +1,64 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.models import Order
+from store.tests import QueryBudgetMixin, make_order, make_products
+
+from .models import CustomUser
+
+
+class AccountPagesQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            phone_number='+79991234567', username='buyer', password='secret'
+        )
+        self.client.force_login(self.user)
+        self.order = make_order(self.user, make_products(25))
+
+    def test_profile(self):
+        # сессия + пользователь + категории навигации + заказы
+        self.assertQueryBudget(reverse('accounts:profile'), 4)
+
+    def test_order_detail_does_not_grow_with_items(self):
+        # сессия + пользователь + категории + заказ + позиции с товарами
+        self.assertQueryBudget(reverse('accounts:order_detail', args=[self.order.id]), 5)
+
+
+class ProfileOrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            phone_number='+79991234567', username='buyer', password='secret'
+        )
+        self.client.force_login(self.user)
+        products = make_products(3)
+        self.orders = [make_order(self.user, products[:i + 1]) for i in range(3)]
+        # Два заказа в одну секунду: порядок между ними задает id
+        created = self.orders[0].created
+        Order.objects.filter(id=self.orders[1].id).update(created=created)
+        Order.objects.filter(id=self.orders[2].id).update(created=created + timedelta(hours=1))
+
+    def get(self, **params):
+        return self.client.get(reverse('accounts:profile'), {'per_page': 2, **params})
+
+    def test_keyset_pages_newest_first(self):
+        first = self.get()
+        self.assertEqual([order.id for order in first.context['orders']], [self.orders[2].id, self.orders[1].id])
+        second = self.get(after=first.context['page'].next_cursor)
+        self.assertEqual([order.id for order in second.context['orders']], [self.orders[0].id])
+        self.assertFalse(second.context['page'].has_next)
+        back = self.get(before=second.context['page'].previous_cursor)
+        self.assertEqual(list(back.context['orders']), list(first.context['orders']))
+        self.assertEqual(self.get(after='не курсор').status_code, 404)
 
-# Create your tests here.
+    def test_list_reads_summary_without_items(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.get()
+        self.assertFalse(any('store_orderitem' in query['sql'] for query in ctx.captured_queries))
+        self.assertContains(response, '3 шт.')
+        self.assertContains(response, self.orders[2].first_item_image.url)
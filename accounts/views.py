@@ -3,8 +3,11 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
+from django.http import Http404
 from .forms import CustomUserCreationForm, CustomAuthenticationForm
+from shop.routers import read_from_replica
 from store.models import Order
+from store.pagination import InvalidCursor, KeysetPaginator, get_page_size
 
 def register(request):
     if request.user.is_authenticated:
@@ -54,19 +57,29 @@ def user_logout(request):
     return redirect('store:product_list')
 
 @login_required
+@read_from_replica
 def profile(request):
-    # Получаем заказы пользователя
-    orders = Order.objects.filter(user=request.user).order_by('-created')
+    # Заказы пользователя: сводка хранится в самом заказе, позиции и товары не читаем
+    orders = Order.objects.filter(user=request.user).only(
+        'id', 'created', 'total_amount', 'status', 'items_count', 'first_item_name', 'first_item_image'
+    )
+    paginator = KeysetPaginator(orders, ordering=('-created', '-id'), per_page=get_page_size(request))
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        raise Http404('Неверный курсор страницы')
     
     return render(request, 'accounts/profile.html', {
-        'orders': orders
+        'orders': page.object_list,
+        'page': page,
+        'per_page': paginator.per_page,
     })
 
 @login_required
 def order_detail(request, order_id):
     # Получаем заказ только для текущего пользователя
     try:
-        order = Order.objects.get(id=order_id, user=request.user)
+        order = Order.objects.with_items().get(id=order_id, user=request.user)
     except Order.DoesNotExist:
         messages.error(request, 'Заказ не найден.')
         return redirect('accounts:profile')
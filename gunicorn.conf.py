@@ -1,4 +1,6 @@
+import glob
 import multiprocessing
+import os
 
 # Количество рабочих процессов
 workers = multiprocessing.cpu_count() * 2 + 1
@@ -6,6 +8,12 @@ workers = multiprocessing.cpu_count() * 2 + 1
 # Тип рабочих процессов
 worker_class = 'sync'
 
+# ASGI_WORKERS=1 - рабочие процессы uvicorn для shop.asgi:application:
+# каждый обслуживает много соединений, поэтому процессов меньше
+if os.environ.get('ASGI_WORKERS') == '1':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    workers = multiprocessing.cpu_count() + 1
+
 # Время ожидания для рабочих процессов
 timeout = 120
 
@@ -29,4 +37,19 @@ group = 'www-data'
 preload_app = True
 
 # Перезапуск при сбое
-graceful_timeout = 30 
\ No newline at end of file
+graceful_timeout = 30 
+
+def on_starting(server):
+    # Метрики прошлого запуска мастер-процесса не должны суммироваться с новыми
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, 'metrics_*.json')):
+            os.remove(path)
+
+def child_exit(server, worker):
+    # Значения завершившегося рабочего процесса переносятся в общий файл,
+    # иначе каталог метрик рос бы с каждым перезапуском по max_requests
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        from shop.metrics import merge_dead_process
+        merge_dead_process(metrics_dir, worker.pid)
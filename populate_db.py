@@ -3,44 +3,13 @@ import os
 import django
 from decimal import Decimal
 import random
-import re
 
 # Настройка Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop.settings')
 django.setup()
 
 from store.models import Category, Product
-
-def create_slug(text):
-    """Создает корректный slug из текста"""
-    # Транслитерация кириллицы
-    translit_map = {
-        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-        'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-        'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-        'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-        'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-        'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ё': 'YO',
-        'Ж': 'ZH', 'З': 'Z', 'И': 'I', 'Й': 'Y', 'К': 'K', 'Л': 'L', 'М': 'M',
-        'Н': 'N', 'О': 'O', 'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U',
-        'Ф': 'F', 'Х': 'H', 'Ц': 'TS', 'Ч': 'CH', 'Ш': 'SH', 'Щ': 'SCH',
-        'Ъ': '', 'Ы': 'Y', 'Ь': '', 'Э': 'E', 'Ю': 'YU', 'Я': 'YA'
-    }
-    
-    # Транслитерация
-    for cyr, lat in translit_map.items():
-        text = text.replace(cyr, lat)
-    
-    # Приведение к нижнему регистру
-    text = text.lower()
-    
-    # Замена пробелов и специальных символов на дефисы
-    text = re.sub(r'[^a-z0-9]+', '-', text)
-    
-    # Удаление начальных и конечных дефисов
-    text = text.strip('-')
-    
-    return text
+from store.utils import create_slug
 
 def create_categories():
     categories_data = [
@@ -0,0 +1,115 @@
+"""
+Настройки базы данных из переменных окружения.
+
+DB_ENGINE=postgresql включает PostgreSQL (POSTGRES_DB, POSTGRES_USER,
+POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT). Соединения переиспользуются
+в пределах DB_CONN_MAX_AGE секунд и проверяются перед использованием.
+DB_POOL=1 включает встроенный пул psycopg (DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+вместо постоянных соединений. Без DB_ENGINE используется SQLite (SQLITE_PATH).
+POSTGRES_REPLICA_HOSTS=host1,host2:5433 добавляет псевдонимы реплик для
+shop.routers.ReplicaRouter с теми же учетными данными.
+
+SQLITE_TUNING=1 готовит SQLite к нескольким рабочим процессам: транзакции
+начинаются с BEGIN IMMEDIATE, а apply_sqlite_pragmas (сигнал connection_created)
+включает WAL и остальные PRAGMA из настройки SQLITE_PRAGMAS.
+"""
+import os
+
+from django.conf import settings
+
+# Ожидание блокировки записи, мс
+SQLITE_BUSY_TIMEOUT = 20000
+
+TUNED_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': SQLITE_BUSY_TIMEOUT,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер в КиБ
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_tuning_enabled():
+    return os.environ.get('SQLITE_TUNING') == '1'
+
+
+def sqlite_pragmas_from_env():
+    return dict(TUNED_SQLITE_PRAGMAS) if sqlite_tuning_enabled() else {}
+
+
+def database_from_env(default_sqlite_path):
+    engine = os.environ.get('DB_ENGINE', 'sqlite')
+    if engine == 'sqlite':
+        database = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', default_sqlite_path),
+        }
+        if sqlite_tuning_enabled():
+            # С DEFERRED чтение внутри транзакции не может перейти к записи, пока
+            # пишет другой процесс, и сразу получает "database is locked"
+            database['OPTIONS'] = {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': SQLITE_BUSY_TIMEOUT / 1000,
+            }
+        return database
+    if engine != 'postgresql':
+        raise ValueError(f'Неизвестный DB_ENGINE: {engine}')
+
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'shop'),
+        'USER': os.environ.get('POSTGRES_USER', 'shop'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if os.environ.get('DB_POOL') == '1':
+        # Пул несовместим с постоянными соединениями Django
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    return database
+
+
+def replicas_from_env(primary):
+    """Псевдонимы реплик: {'replica1': {...}, ...}"""
+    hosts = [host.strip() for host in os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',') if host.strip()]
+    if hosts and primary['ENGINE'] != 'django.db.backends.postgresql':
+        raise ValueError('Реплики поддерживаются только для PostgreSQL')
+    replicas = {}
+    for number, address in enumerate(hosts, start=1):
+        host, _, port = address.partition(':')
+        replicas[f'replica{number}'] = {
+            **primary,
+            'OPTIONS': dict(primary['OPTIONS']),
+            'HOST': host,
+            'PORT': port or primary['PORT'],
+            # В тестах реплика - та же база, что и основная
+            'TEST': {'MIRROR': 'default'},
+        }
+    return replicas
+
+
+def local_replica(primary):
+    """Псевдоним той же базы, что и primary, с отдельной тестовой базой"""
+    replica = {**primary, 'OPTIONS': dict(primary.get('OPTIONS', {}))}
+    if primary['ENGINE'] == 'django.db.backends.postgresql':
+        replica['TEST'] = {'NAME': f'test_{primary["NAME"]}_replica'}
+    return replica
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Выполняет PRAGMA из SQLITE_PRAGMAS для каждого нового соединения с SQLite"""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,199 @@
+"""
+Замеры времени и SQL-запросов для каждого запроса.
+
+RequestMetricsMiddleware включается в settings_production переменной окружения
+REQUEST_METRICS=1. Он добавляет заголовок Server-Timing, пишет выборку запросов
+в JSON-лог shop.requests и подробный дамп (SQL и стек) для медленных запросов.
+Время рендеринга шаблонов считает бэкенд InstrumentedDjangoTemplates.
+"""
+import json
+import logging
+import random
+import sys
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger('shop.requests')
+
+_current = ContextVar('request_stats', default=None)
+
+# Кадры Django и стандартной библиотеки в стеке запроса не интересны
+_SKIPPED_FRAMES = ('/django/', '/asgiref/', '/gunicorn/', 'shop/instrumentation.py')
+# Имя файла -> пропускать ли его кадры; файлов конечное число
+_skipped_files = {}
+
+
+def _call_site(depth):
+    """Ближайшие к SQL-запросу кадры кода приложения: (файл, строка, функция).
+
+    Выполняется для каждого запроса, поэтому только обход f_back без чтения
+    исходников, как в traceback.extract_stack; текст собирается при записи в лог.
+    """
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < depth:
+        code = frame.f_code
+        skipped = _skipped_files.get(code.co_filename)
+        if skipped is None:
+            skipped = _skipped_files[code.co_filename] = any(part in code.co_filename for part in _SKIPPED_FRAMES)
+        if not skipped:
+            frames.append((code.co_filename, frame.f_lineno, code.co_name))
+        frame = frame.f_back
+    return frames
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.template_ms = 0.0
+        self._template_depth = 0
+
+    @property
+    def db_ms(self):
+        return sum(query['ms'] for query in self.queries)
+
+    @property
+    def duplicates(self):
+        seen = set()
+        duplicates = 0
+        for query in self.queries:
+            key = (query['sql'], query['params'])
+            if key in seen:
+                duplicates += 1
+            seen.add(key)
+        return duplicates
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': repr(params),
+                'ms': (time.perf_counter() - started) * 1000,
+                'stack': _call_site(settings.REQUEST_METRICS_STACK_DEPTH),
+            })
+
+
+def current_stats():
+    return _current.get()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        # Вложенный render_to_string из тегов не считаем дважды
+        stats._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats._template_depth -= 1
+            if not stats._template_depth:
+                stats.template_ms += (time.perf_counter() - started) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, замеряющий время рендеринга для RequestMetricsMiddleware"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class RequestMetricsMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            with self.record_queries(stats):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            # Запросы асинхронного ORM идут в потоке sync_to_async, см. MetricsMiddleware
+            stack = await sync_to_async(self.record_queries)(stats)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    def record_queries(self, stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats.record_query))
+        return stack
+
+    def finish(self, request, response, stats):
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={stats.db_ms:.1f};desc="{len(stats.queries)} queries"',
+            f'tpl;dur={stats.template_ms:.1f}',
+        ])
+        self.log(request, response, stats, total_ms)
+        return response
+
+    def log(self, request, response, stats, total_ms):
+        slow = total_ms >= settings.REQUEST_METRICS_SLOW_MS
+        if not slow and random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return
+
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(stats.db_ms, 2),
+            'template_ms': round(stats.template_ms, 2),
+            'queries': len(stats.queries),
+            'duplicate_queries': stats.duplicates,
+        }
+        if slow:
+            record['slow'] = True
+            record['sql'] = [
+                {'alias': q['alias'], 'ms': round(q['ms'], 2), 'sql': q['sql'],
+                 'params': q['params'],
+                 'stack': [f'{filename}:{lineno} {name}' for filename, lineno, name in reversed(q['stack'])]}
+                for q in stats.queries
+            ]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
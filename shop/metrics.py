@@ -0,0 +1,264 @@
+"""
+Метрики в текстовом формате Prometheus.
+
+Каждый процесс gunicorn считает метрики у себя в памяти и периодически
+сбрасывает их в файл METRICS_DIR/metrics_<pid>.json. Эндпоинт metrics_view
+складывает файлы всех процессов. Когда рабочий процесс завершается
+(max_requests), мастер переносит его значения в общий metrics_dead.json и
+удаляет его файл, поэтому счётчики не теряются, а файлов не больше, чем
+живых процессов плюс один. Без METRICS_DIR метрики видны только для
+текущего процесса.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+CART_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_lock = threading.Lock()
+_metrics = {}
+_values = {}
+_last_flush = 0.0
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _key(self, labels):
+        return (self.name, tuple(str(labels[name]) for name in self.labelnames))
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            _values[key] = _values.get(key, 0) + amount
+        _maybe_flush()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts, total, count = _values.get(key) or ([0] * len(self.buckets), 0, 0)
+            counts = [c + (value <= bound) for c, bound in zip(counts, self.buckets)]
+            _values[key] = (counts, total + value, count + 1)
+        _maybe_flush()
+
+
+http_requests = Counter(
+    'shop_http_requests_total', 'Запросы по представлениям', ['view', 'method', 'status']
+)
+http_duration = Histogram(
+    'shop_http_request_duration_seconds', 'Время обработки запроса', ['view']
+)
+db_queries = Histogram(
+    'shop_db_queries_per_request', 'SQL-запросов на запрос', ['view'], buckets=QUERY_BUCKETS
+)
+checkouts = Counter(
+    'shop_checkout_total', 'Попытки оформления заказа', ['result']
+)
+checkout_cart_lines = Histogram(
+    'shop_checkout_cart_lines', 'Позиций в корзине при оформлении заказа', buckets=CART_BUCKETS
+)
+order_value = Counter(
+    'shop_order_value_total', 'Сумма оформленных заказов'
+)
+
+
+DEAD_PROCESSES_FILE = 'metrics_dead.json'
+
+
+def _metrics_path():
+    return os.path.join(settings.METRICS_DIR, f'metrics_{os.getpid()}.json')
+
+
+def _serialize():
+    with _lock:
+        return [[name, list(labels), value] for (name, labels), value in _values.items()]
+
+
+def _write(path, entries):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(entries, f)
+    os.replace(tmp, path)
+
+
+def flush():
+    """Сохраняет значения текущего процесса в его файл"""
+    global _last_flush
+    if not settings.METRICS_DIR:
+        return
+    _last_flush = time.monotonic()
+    _write(_metrics_path(), _serialize())
+
+
+def merge_dead_process(metrics_dir, pid):
+    """Переносит значения завершившегося процесса pid в DEAD_PROCESSES_FILE.
+
+    Вызывается мастер-процессом gunicorn из child_exit, до запуска замены.
+    """
+    path = os.path.join(metrics_dir, f'metrics_{pid}.json')
+    dead_path = os.path.join(metrics_dir, DEAD_PROCESSES_FILE)
+    values = {}
+    for source in (dead_path, path):
+        try:
+            with open(source) as f:
+                _merge(values, json.load(f))
+        except (OSError, ValueError):
+            continue
+    _write(dead_path, [[name, list(labels), value] for (name, labels), value in values.items()])
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _maybe_flush():
+    if settings.METRICS_DIR and time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+atexit.register(lambda: settings.configured and flush())
+
+
+def _merge(values, entries):
+    for name, labels, value in entries:
+        key = (name, tuple(labels))
+        current = values.get(key)
+        if current is None:
+            values[key] = value
+        elif isinstance(value, list):
+            counts, total, count = current
+            values[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1], count + value[2])
+        else:
+            values[key] = current + value
+
+
+def collect():
+    """Значения всех процессов: {(name, labels): value}"""
+    if not settings.METRICS_DIR:
+        return dict(_values)
+    flush()
+    values = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics_*.json')):
+        try:
+            with open(path) as f:
+                _merge(values, json.load(f))
+        except (OSError, ValueError):
+            continue
+    return values
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+
+def render():
+    values = collect()
+    lines = []
+    for name, metric in sorted(_metrics.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        samples = sorted((labels, value) for (metric_name, labels), value in values.items() if metric_name == name)
+        for labels, value in samples:
+            if metric.type == 'histogram':
+                counts, total, count = value
+                for bound, bucket in zip(metric.buckets, counts):
+                    lines.append(f'{name}_bucket{_labels(metric.labelnames, labels, [("le", bound)])} {bucket}')
+                lines.append(f'{name}_bucket{_labels(metric.labelnames, labels, [("le", "+Inf")])} {count}')
+                lines.append(f'{name}_sum{_labels(metric.labelnames, labels)} {total}')
+                lines.append(f'{name}_count{_labels(metric.labelnames, labels)} {count}')
+            else:
+                lines.append(f'{name}{_labels(metric.labelnames, labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Метрики для Prometheus; доступ ограничивается в nginx"""
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    """Время, статус и число SQL-запросов для каждого представления"""
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = [0]
+        started = time.perf_counter()
+        with self.count_queries(queries):
+            response = self.get_response(request)
+        self.observe(request, response, started, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        queries = [0]
+        started = time.perf_counter()
+        # Асинхронный ORM выполняет запросы через sync_to_async в отдельном потоке
+        # со своими соединениями, поэтому обертки ставятся в том же потоке
+        stack = await sync_to_async(self.count_queries)(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.observe(request, response, started, queries[0])
+        return response
+
+    def count_queries(self, queries):
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(count_query))
+        return stack
+
+    def observe(self, request, response, started, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        http_requests.inc(view=view, method=request.method, status=response.status_code)
+        http_duration.observe(time.perf_counter() - started, view=view)
+        db_queries.observe(queries, view=view)
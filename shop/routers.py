@@ -0,0 +1,125 @@
+"""
+Чтение каталога с реплик.
+
+ReplicaRouter отправляет чтения Category и Product на одну из реплик
+DATABASE_REPLICAS, представления с декоратором read_from_replica читают с
+реплики все модели. Реплика используется только внутри GET/HEAD-запросов,
+размеченных ReplicaMiddleware: записи, POST-запросы, команды и скрипты
+работают с основной базой. После запроса с записью клиент получает cookie
+use_primary и DATABASE_REPLICA_STICKY_SECONDS секунд читает с основной базы,
+чтобы увидеть свои изменения (например, order_success после order_create).
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_MODELS = {'store.category', 'store.product'}
+PRIMARY_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    def __init__(self, replica_allowed):
+        self.replica_allowed = replica_allowed
+        self.all_models = False
+        self.wrote = False
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if not settings.DATABASE_REPLICAS or state is None or not state.replica_allowed:
+            return None
+        if state.all_models or model._meta.label_lower in REPLICA_MODELS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит с репликацией
+        return db not in settings.DATABASE_REPLICAS
+
+
+def read_from_replica(view):
+    """Все чтения представления идут на реплику, если запросу она разрешена"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is None:
+            return view(request, *args, **kwargs)
+        previous = state.all_models
+        state.all_models = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.all_models = previous
+    return wrapper
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение с реплик и закрепляет клиента за основной базой после записи"""
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        # Асинхронный ORM выполняет запросы в потоке с копией контекста, поэтому
+        # состояние - изменяемый объект, а не отдельные значения ContextVar
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        return RoutingState(
+            replica_allowed=request.method in SAFE_METHODS and PRIMARY_COOKIE not in request.COOKIES
+        )
+
+    def finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                PRIMARY_COOKIE, '1', max_age=settings.DATABASE_REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import database_from_env, local_replica, sqlite_pragmas_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,11 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'shop.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.middleware.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -63,6 +69,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.categories',
+                'store.context_processors.cart',
             ],
         },
     },
@@ -74,12 +82,21 @@ WSGI_APPLICATION = 'shop.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# PostgreSQL включается переменными окружения, см. shop/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR / 'db.sqlite3'),
 }
+# Локальная «реплика» - та же база под другим псевдонимом. В тестах для нее
+# создается отдельная база, чтобы проверять маршрутизацию чтений
+DATABASES['replica'] = local_replica(DATABASES['default'])
+
+# Чтение каталога с реплик (shop/routers.py); пустой список отключает маршрутизацию
+DATABASE_ROUTERS = ['shop.routers.ReplicaRouter']
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_STICKY_SECONDS = 5
+
+# PRAGMA для каждого соединения с SQLite, включаются SQLITE_TUNING=1
+SQLITE_PRAGMAS = sqlite_pragmas_from_env()
 
 
 # Password validation
@@ -131,3 +148,53 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Кастомная модель пользователя
 AUTH_USER_MODEL = 'accounts.CustomUser'
+
+# Оба алиаса указывают на одно хранилище LocMemCache (общий LOCATION):
+# cache.clear() очищает и страницы. В settings_production это разные каталоги
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shop',
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shop',
+    },
+}
+
+# Каталог: размер страницы и время кэширования количества товаров
+STORE_PAGE_SIZE = 24
+STORE_MAX_PAGE_SIZE = 96
+STORE_COUNT_CACHE_TIMEOUT = 300
+# Списки админки длиннее этого числа строк показывают оценку вместо COUNT(*)
+STORE_EXACT_COUNT_LIMIT = 10000
+
+# Кэш страниц каталога для анонимных посетителей
+STORE_PAGE_CACHE_TIMEOUT = 600
+
+# Хранилище корзины: CookieCartStorage, CacheCartStorage или SessionCartStorage
+STORE_CART_STORAGE = 'store.cart.CookieCartStorage'
+STORE_CART_COOKIE_AGE = 60 * 60 * 24 * 14
+STORE_CART_BATCH_LIMIT = 200
+# Сколько разных товаров помещается в корзину CookieCartStorage (cookie до 4 КБ)
+STORE_CART_COOKIE_MAX_LINES = 150
+
+# Поиск по товарам (store/search.py): больше результатов не показываем
+STORE_SEARCH_MAX_RESULTS = 1000
+
+# Уменьшенные копии изображений товаров (store/images.py)
+STORE_IMAGE_WIDTHS = (160, 320, 640, 1024)
+STORE_IMAGE_FORMATS = ('webp', 'jpeg')
+STORE_IMAGE_QUALITY = 80
+
+# Асинхронные представления каталога и корзины (store/async_views.py), включаются в shop/asgi.py
+STORE_ASYNC_VIEWS = os.environ.get('STORE_ASYNC_VIEWS') == '1'
+
+# Замеры запросов (shop.instrumentation.RequestMetricsMiddleware)
+REQUEST_METRICS_SAMPLE_RATE = 0.01
+REQUEST_METRICS_SLOW_MS = 500
+REQUEST_METRICS_STACK_DEPTH = 25
+
+# Метрики Prometheus: каталог для файлов процессов gunicorn (None - только память процесса)
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5
@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from .database import database_from_env, replicas_from_env
 from .settings import *
 
 # SECURITY WARNING: don't run with debug turned on in production!
@@ -13,11 +14,38 @@ ALLOWED_HOSTS = ['your-domain.com', 'www.your-domain.com', 'your-server-ip']
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# В production используется PostgreSQL: DB_ENGINE=postgresql и POSTGRES_*,
+# см. shop/database.py. Небольшие магазины могут остаться на SQLite
+# с SQLITE_TUNING=1 (WAL, busy_timeout и BEGIN IMMEDIATE).
 DATABASES = {
+    'default': database_from_env(BASE_DIR / 'db.sqlite3'),
+}
+# Реплики для чтения каталога и профиля: POSTGRES_REPLICA_HOSTS=host1,host2
+DATABASES.update(replicas_from_env(DATABASES['default']))
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+# Общий кэш для всех рабочих процессов gunicorn
+CACHE_DIR = os.environ.get('CACHE_DIR', BASE_DIR / 'cache')
+# FileBasedCache при переполнении удаляет случайную 1/CULL_FREQUENCY часть файлов.
+# Версии ключей каталога и корзины живут отдельно от страниц, чтобы вытеснение
+# страниц их не задевало; лимиты рассчитаны на каталог в сотни тысяч товаров
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'default'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 500000)),
+        },
+    },
+    # Страницы каталога, фрагменты карточек и количества - их можно потерять
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'pages'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 200000)),
+            'CULL_FREQUENCY': 10,
+        },
+    },
 }
 
 # Static files (CSS, JavaScript, Images)
@@ -25,6 +53,15 @@ DATABASES = {
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Имена с хэшем содержимого и сжатые копии .gz/.br для gzip_static в nginx.conf
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'shop.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Media files
 MEDIA_URL = '/media/'
@@ -40,16 +77,38 @@ X_FRAME_OPTIONS = 'DENY'
 # SESSION_COOKIE_SECURE = True
 # CSRF_COOKIE_SECURE = True
 
+# Метрики всех рабочих процессов gunicorn собираются через файлы в этом каталоге
+METRICS_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR', str(BASE_DIR / 'metrics'))
+os.makedirs(METRICS_DIR, exist_ok=True)
+
+# Замеры времени и SQL для каждого запроса (REQUEST_METRICS=1)
+if os.environ.get('REQUEST_METRICS') == '1':
+    MIDDLEWARE = ['shop.instrumentation.RequestMetricsMiddleware'] + MIDDLEWARE
+    TEMPLATES[0]['BACKEND'] = 'shop.instrumentation.InstrumentedDjangoTemplates'
+    REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', REQUEST_METRICS_SAMPLE_RATE))
+    REQUEST_METRICS_SLOW_MS = float(os.environ.get('REQUEST_METRICS_SLOW_MS', REQUEST_METRICS_SLOW_MS))
+
 # Logging
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'raw': {
+            'format': '%(message)s',
+        },
+    },
     'handlers': {
         'file': {
             'level': 'INFO',
             'class': 'logging.FileHandler',
             'filename': BASE_DIR / 'logs' / 'django.log',
         },
+        'requests': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'logs' / 'requests.log',
+            'formatter': 'raw',
+        },
     },
     'loggers': {
         'django': {
@@ -57,6 +116,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'shop.requests': {
+            'handlers': ['requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
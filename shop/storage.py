@@ -0,0 +1,79 @@
+"""
+Хранилище статики для production.
+
+Имена файлов содержат хэш содержимого (ManifestStaticFilesStorage), поэтому
+nginx отдает их с бессрочным кэшированием. Во время collectstatic рядом с
+текстовыми файлами записываются сжатые копии .gz и .br - nginx отдает их
+через gzip_static/brotli_static и не сжимает статику на каждый запрос.
+"""
+import gzip
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # без brotli создаются только .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Шрифты woff/woff2 и изображения уже сжаты
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot'}
+# Меньшие файлы помещаются в один пакет и без сжатия
+MIN_COMPRESS_SIZE = 256
+
+
+def gzip_compress(data):
+    # mtime=0: одинаковый результат при повторной сборке
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_compress(data):
+    return brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def compressors(self):
+        compressors = {'.gz': gzip_compress}
+        if brotli is not None:
+            compressors['.br'] = brotli_compress
+        return compressors
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = {}
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names[name] = hashed_name
+            yield name, hashed_name, processed
+
+        if not dry_run:
+            # Сжатие занимает большую часть времени collectstatic: zlib и brotli
+            # отпускают GIL, поэтому файлы сжимаются в потоках параллельно
+            with ThreadPoolExecutor() as executor:
+                list(executor.map(self.compress, hashed_names.values()))
+
+    def compress(self, name):
+        """Записывает сжатые копии файла name; возвращает их имена"""
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return []
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return []
+
+        written = []
+        for suffix, compress in self.compressors().items():
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                continue
+            path = name + suffix
+            if self.exists(path):
+                self.delete(path)
+            self._save(path, ContentFile(compressed))
+            written.append(path)
+        logger.debug('Сжат %s: %s', name, ', '.join(written))
+        return written
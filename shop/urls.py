@@ -19,8 +19,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Доступ к /internal/ разрешается только в nginx
+    path('internal/metrics/', metrics_view, name='metrics'),
     path('accounts/', include('accounts.urls', namespace='accounts')),
     path('', include('store.urls', namespace='store')),
 ]
@@ -1,5 +1,102 @@
-from django.contrib import admin
+import io
+import json
+from datetime import datetime
+
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db import router, transaction
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from .caching import invalidate_products
+from .catalog_import import ProductImporter, read_rows
+from .export import export_response
+from .forms import ProductImportForm
 from .models import Category, Product, Order, OrderItem
+from .pagination import EstimatedCountPaginator
+from .search import reindex_products
+
+# Сколько ошибок импорта показывать в сообщении
+MAX_IMPORT_ERRORS = 20
+# Размер пачки массовых изменений: одна пачка - одна короткая транзакция
+BULK_BATCH_SIZE = 1000
+
+
+def change_log_entry(request, obj, message):
+    """Запись истории изменений без сохранения, для LogEntry.objects.bulk_create"""
+    return LogEntry(
+        user_id=request.user.pk,
+        content_type_id=ContentType.objects.get_for_model(obj, for_concrete_model=False).id,
+        object_id=obj.pk,
+        object_repr=str(obj)[:200],
+        action_flag=CHANGE,
+        change_message=json.dumps(message) if isinstance(message, list) else message,
+    )
+
+
+MONTHS = [
+    'Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+    'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь',
+]
+# Как долго помнить первый и последний год в таблице
+CREATED_YEARS_TIMEOUT = 60 * 60
+
+
+class CreatedMonthFilter(admin.SimpleListFilter):
+    """Год и месяц создания вместо date_hierarchy.
+
+    date_hierarchy строит ссылки через SELECT DISTINCT по всей таблице на каждой
+    загрузке списка. Здесь годы берутся из закэшированных первой и последней даты, а
+    фильтр - диапазон created; оба запроса идут по индексам
+    store_order_created_idx и store_product_created_idx.
+    """
+    title = 'месяц создания'
+    parameter_name = 'created_month'
+    
+    def lookups(self, request, model_admin):
+        first, last = self.years(model_admin.model)
+        if first is None:
+            return []
+        choices = []
+        selected_year = self.value()[:4] if self.value() else None
+        for year in range(last, first - 1, -1):
+            choices.append((str(year), str(year)))
+            if str(year) == selected_year:
+                choices.extend((f'{year}-{month:02}', f'{name} {year}') for month, name in enumerate(MONTHS, 1))
+        return choices
+    
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            year, _, month = self.value().partition('-')
+            start = datetime(int(year), int(month or 1), 1)
+            if month:
+                end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+            else:
+                end = datetime(start.year + 1, 1, 1)
+        except ValueError:
+            raise IncorrectLookupParameters(self.value())
+        return queryset.filter(
+            created__gte=timezone.make_aware(start), created__lt=timezone.make_aware(end)
+        )
+    
+    def years(self, model):
+        key = f'store:admin:created-years:{model._meta.label_lower}'
+        years = cache.get(key)
+        if years is None:
+            # Два запроса ORDER BY ... LIMIT 1: MIN и MAX в одном запросе SQLite считает полным проходом
+            created = model.objects.values_list('created', flat=True)
+            bounds = [created.order_by('created').first(), created.order_by('-created').first()]
+            years = [timezone.localtime(bound).year if bound else None for bound in bounds]
+            cache.set(key, years, CREATED_YEARS_TIMEOUT)
+        return years
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -10,40 +107,179 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'price', 'stock', 'available', 'created']
-    list_filter = ['available', 'created', 'category']
+    list_filter = ['available', CreatedMonthFilter, 'category']
     list_editable = ['price', 'stock', 'available']
+    list_select_related = ['category']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
-    date_hierarchy = 'created'
+    # Порядок по названию, как в Meta; id делает его однозначным, и тогда
+    # первую страницу отдает индекс store_product_name_idx без сортировки каталога
+    ordering = ['name', 'id']
+    # Основное время страницы - отрисовка полей list_editable (три на строку)
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/store/product/change_list.html'
+    
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'POST' or '_save' not in request.POST:
+            return super().changelist_view(request, extra_context)
+        # Сохранение list_editable: save_model и log_change только копят изменения,
+        # а в базу они уходят одним bulk_update без сигналов на каждую строку
+        request.bulk_edits = {'products': [], 'fields': set(), 'log': []}
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            response = super().changelist_view(request, extra_context)
+            self.save_bulk_edits(request.bulk_edits)
+        return response
+    
+    def save_model(self, request, obj, form, change):
+        edits = getattr(request, 'bulk_edits', None)
+        if edits is None:
+            return super().save_model(request, obj, form, change)
+        edits['products'].append(obj)
+        edits['fields'].update(form.changed_data)
+    
+    def log_change(self, request, obj, message):
+        edits = getattr(request, 'bulk_edits', None)
+        if edits is None:
+            return super().log_change(request, obj, message)
+        entry = change_log_entry(request, obj, message)
+        edits['log'].append(entry)
+        return entry
+    
+    def save_bulk_edits(self, edits):
+        products = edits['products']
+        if not products:
+            return
+        # auto_now при bulk_update не срабатывает
+        now = timezone.now()
+        for product in products:
+            product.updated = now
+        Product.objects.bulk_update(products, [*edits['fields'], 'updated'], batch_size=BULK_BATCH_SIZE)
+        LogEntry.objects.bulk_create(edits['log'], batch_size=BULK_BATCH_SIZE)
+        ids = [product.pk for product in products]
+        reindex = bool({'name', 'description'} & edits['fields'])
+
+        def after_commit():
+            # Кэш сбрасывается только после коммита, как в сигналах товара: иначе
+            # страница, отрисованная до коммита, закэшировалась бы под новой версией
+            if reindex:
+                reindex_products(ids)
+            invalidate_products(ids)
+
+        transaction.on_commit(after_commit, using=router.db_for_write(self.model))
+    
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='store_product_import'),
+        ] + super().get_urls()
+    
+    def import_view(self, request):
+        """Загрузка файла выгрузки ERP, см. store/catalog_import.py"""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            # Файл читается построчно и не загружается в память целиком
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            importer = ProductImporter(dry_run=form.cleaned_data['dry_run']).run(
+                read_rows(stream, form.cleaned_data['format'])
+            )
+            for line, message in importer.errors[:MAX_IMPORT_ERRORS]:
+                messages.warning(request, f'Строка {line}: {message}')
+            if len(importer.errors) > MAX_IMPORT_ERRORS:
+                messages.warning(request, f'... и еще {len(importer.errors) - MAX_IMPORT_ERRORS} ошибок')
+            prefix = 'Проверено (без записи)' if form.cleaned_data['dry_run'] else 'Загружено'
+            messages.success(request, (
+                f'{prefix}: строк {importer.rows}, новых {importer.created}, обновлено {importer.updated}, '
+                f'ошибок {len(importer.errors)} ({importer.rows_per_second:.0f} строк/с)'
+            ))
+            return redirect('admin:store_product_changelist')
+        
+        return TemplateResponse(request, 'admin/store/product/import.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': 'Импорт товаров',
+        })
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
     readonly_fields = ['price']
+    # Вместо выпадающего списка со всем каталогом в каждой строке
+    autocomplete_fields = ['product']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'customer_name', 'customer_email', 'total_amount', 'status', 'created']
-    list_filter = ['status', 'created']
+    list_display = ['id', 'user', 'customer_name', 'customer_email', 'total_amount', 'status', 'created']
+    list_filter = ['status', CreatedMonthFilter]
+    # Order.__str__ (подпись флажка действия) обращается к пользователю
+    list_select_related = ['user']
     search_fields = ['customer_name', 'customer_email', 'customer_phone']
     readonly_fields = ['created', 'updated']
     inlines = [OrderItemInline]
-    date_hierarchy = 'created'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    actions = [
+        'mark_as_paid', 'mark_as_shipped', 'mark_as_delivered', 'mark_as_cancelled',
+        'export_csv', 'export_jsonl',
+    ]
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Позиции могли измениться - пересчитываем сводку для списка заказов в профиле
+        form.instance.refresh_summary()
     
-    actions = ['mark_as_paid', 'mark_as_shipped', 'mark_as_delivered', 'mark_as_cancelled']
+    def update_status(self, request, queryset, status):
+        """Меняет статус выбранных заказов пачками по BULK_BATCH_SIZE.
+
+        Каждая пачка - отдельная короткая транзакция, поэтому выбор «всех»
+        заказов не держит блокировку на всю таблицу до конца действия.
+        """
+        using = router.db_for_write(Order)
+        queryset = queryset.exclude(status=status).order_by('pk').select_related('user').only(
+            'id', 'customer_name', 'user__username'
+        )
+        message = [{'changed': {'fields': [str(Order._meta.get_field('status').verbose_name)]}}]
+        count = last_id = 0
+        while orders := list(queryset.filter(pk__gt=last_id)[:BULK_BATCH_SIZE]):
+            last_id = orders[-1].pk
+            with transaction.atomic(using=using):
+                count += Order.objects.using(using).filter(pk__in=[order.pk for order in orders]).exclude(
+                    status=status
+                ).update(status=status, updated=timezone.now())
+                LogEntry.objects.using(using).bulk_create(
+                    [change_log_entry(request, order, message) for order in orders]
+                )
+        self.message_user(request, f'Статус «{dict(Order.STATUS_CHOICES)[status]}» у заказов: {count}')
     
     def mark_as_paid(self, request, queryset):
-        queryset.update(status='paid')
+        self.update_status(request, queryset, 'paid')
     mark_as_paid.short_description = "Отметить как оплаченные"
     
     def mark_as_shipped(self, request, queryset):
-        queryset.update(status='shipped')
+        self.update_status(request, queryset, 'shipped')
     mark_as_shipped.short_description = "Отметить как отправленные"
     
     def mark_as_delivered(self, request, queryset):
-        queryset.update(status='delivered')
+        self.update_status(request, queryset, 'delivered')
     mark_as_delivered.short_description = "Отметить как доставленные"
     
     def mark_as_cancelled(self, request, queryset):
-        queryset.update(status='cancelled')
+        self.update_status(request, queryset, 'cancelled')
     mark_as_cancelled.short_description = "Отметить как отмененные"
+    
+    # Выгрузка потоковая: выбранные заказы (или все по фильтрам) не загружаются в память
+    def export_csv(self, request, queryset):
+        return export_response(queryset, 'csv')
+    export_csv.short_description = "Выгрузить позиции в CSV"
+    
+    def export_jsonl(self, request, queryset):
+        return export_response(queryset, 'jsonl')
+    export_jsonl.short_description = "Выгрузить позиции в JSONL"
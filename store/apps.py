@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from shop.database import apply_sqlite_pragmas
+        from . import signals  # noqa: F401
+
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='shop.sqlite_pragmas')
@@ -0,0 +1,108 @@
+"""
+Асинхронные версии представлений каталога и корзины.
+
+Подключаются в store/urls.py при STORE_ASYNC_VIEWS = True (shop/asgi.py
+включает его сам). Запросы к базе идут через асинхронный ORM, шаблоны и
+контекстные процессоры синхронные и рендерятся в потоке.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from .caching import cache_catalog_page, product_detail_versions, product_list_versions
+from .cart import CartFullError, CartOperationError, aapply_cart_operations, ahydrate_cart
+from .models import Category, Product
+from .pagination import InvalidCursor, KeysetPaginator, acached_count, get_page_size
+from .views import cart_response
+
+arender = sync_to_async(render)
+
+
+@cache_catalog_page(product_list_versions)
+async def product_list(request, category_slug=None):
+    category = None
+    products = Product.objects.for_listing().filter(available=True)
+
+    if category_slug:
+        category = await aget_object_or_404(Category, slug=category_slug)
+        products = products.filter(category=category)
+
+    paginator = KeysetPaginator(products, ordering=('name', 'id'), per_page=get_page_size(request))
+    try:
+        page = await paginator.apage(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        raise Http404('Неверный курсор страницы')
+
+    return await arender(request, 'store/product_list.html', {
+        'category': category,
+        'products': page.object_list,
+        'page': page,
+        'per_page': paginator.per_page,
+        'total_count': await acached_count(products)
+    })
+
+
+@cache_catalog_page(product_detail_versions)
+async def product_detail(request, id, slug):
+    product = await aget_object_or_404(Product.objects.for_detail(), id=id, slug=slug, available=True)
+    return await arender(request, 'store/product_detail.html', {
+        'product': product
+    })
+
+
+async def add_to_cart(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Неверный запрос'})
+
+    data = json.loads(request.body)
+    product = await aget_object_or_404(
+        Product.objects.only('id', 'name'), id=data.get('product_id'), available=True
+    )
+    try:
+        request.cart.add(product.id, int(data.get('quantity', 1)))
+    except CartFullError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'message': f'{product.name} добавлен в корзину',
+        'cart_count': request.cart.count
+    })
+
+
+async def cart_batch(request):
+    """Пакетное изменение корзины, см. views.cart_batch"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Неверный запрос'}, status=405)
+
+    try:
+        operations = json.loads(request.body).get('operations')
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Неверный запрос'}, status=400)
+
+    try:
+        cart = await aapply_cart_operations(request.cart, operations)
+    except CartOperationError as e:
+        return JsonResponse({'success': False, 'message': str(e), 'errors': e.errors}, status=400)
+
+    return cart_response(cart)
+
+
+async def cart_detail(request):
+    cart = await ahydrate_cart(request.cart)
+
+    return await arender(request, 'store/cart_detail.html', {
+        'cart_items': cart.lines,
+        'total': cart.total
+    })
+
+
+async def remove_from_cart(request, product_id):
+    if product_id in request.cart:
+        request.cart.remove(product_id)
+        messages.success(request, 'Товар удален из корзины')
+
+    return redirect('store:cart_detail')
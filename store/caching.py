@@ -0,0 +1,208 @@
+import hashlib
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from .models import Category
+
+# Кэш для записей, которые можно потерять: страницы, фрагменты карточек, количества.
+# Версии ключей и корзины остаются в default, чтобы вытеснение страниц их не задевало
+PAGE_CACHE = 'pages'
+
+CATEGORIES_VERSION_KEY = 'store:categories:version'
+CATEGORIES_TIMEOUT = 60 * 60 * 24
+
+# Локальная копия процесса: (версия, список категорий)
+_local_categories = (None, None)
+
+
+# Метки, которые подставляются в закэшированную страницу на каждый запрос
+CSRF_HOLE = 'store-csrf-token-hole'
+CART_COUNT_HOLE = 'store-cart-count-hole'
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+async def _aversion(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, uuid.uuid4().hex, None)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump(*keys):
+    cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+
+def _categories_version():
+    return _version(CATEGORIES_VERSION_KEY)
+
+
+def get_categories():
+    """Список категорий для навигации.
+
+    Данные лежат в общем кэше под ключом с версией, а каждый процесс держит
+    свою копию, пока версия в общем кэше не изменится.
+    """
+    global _local_categories
+    version = _categories_version()
+    local_version, categories = _local_categories
+    if local_version == version and version is not None:
+        return categories
+
+    key = f'store:categories:{version}'
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.only('id', 'name', 'slug'))
+        cache.set(key, categories, CATEGORIES_TIMEOUT)
+    _local_categories = (version, categories)
+    return categories
+
+
+def invalidate_categories():
+    global _local_categories
+    _bump(CATEGORIES_VERSION_KEY)
+    _local_categories = (None, None)
+
+
+def _product_version_key(product_id):
+    return f'store:catalog:product:{product_id}:version'
+
+
+PRODUCT_LIST_VERSION_KEY = 'store:catalog:list:version'
+
+
+def invalidate_products(product_ids):
+    """Сбрасывает страницы списков и карточки перечисленных товаров"""
+    _bump(PRODUCT_LIST_VERSION_KEY, *(_product_version_key(pid) for pid in product_ids))
+
+
+def product_list_versions(request, **kwargs):
+    return [PRODUCT_LIST_VERSION_KEY]
+
+
+def product_detail_versions(request, **kwargs):
+    return [_product_version_key(kwargs['id'])]
+
+
+def is_rendering_for_cache(request):
+    return getattr(request, '_catalog_page_cache', False)
+
+
+def _is_cacheable(request, user=None):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if (user or request.user).is_authenticated:
+        return False
+    # Страницы с сообщениями персональны - рендерим их как обычно
+    return not len(get_messages(request))
+
+
+async def _ais_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # auser() загружает сессию, после этого сообщения читаются без запросов
+    return _is_cacheable(request, await request.auser())
+
+
+def _page_key(request, versions):
+    version = ':'.join(versions)
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'store:page:{path}:{hashlib.md5(version.encode()).hexdigest()}'
+
+
+def _cache_entry(response, request):
+    """Содержимое для кэша или None; в ответ подставляются значения для запроса"""
+    if response.streaming:
+        return None
+    content = response.content.decode(response.charset)
+    response.content = _fill_holes(content, request)
+    if response.status_code != 200:
+        return None
+    return content, response['Content-Type']
+
+
+def _fill_holes(content, request):
+    return (
+        content
+        .replace(CSRF_HOLE, get_token(request))
+        .replace(CART_COUNT_HOLE, str(len(request.cart)))
+    )
+
+
+def cache_catalog_page(versions):
+    """Кэширует страницу каталога целиком для анонимных посетителей.
+
+    Ключ строится из пути с параметрами и версий из versions(request, **kwargs);
+    сигналы Product/Category меняют версии, и старые записи больше не читаются.
+    CSRF-токен и счётчик корзины подставляются в готовый HTML на каждый запрос.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            return _acache_catalog_page(view, versions)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable(request):
+                return view(request, *args, **kwargs)
+
+            version_keys = [CATEGORIES_VERSION_KEY] + versions(request, **kwargs)
+            key = _page_key(request, [_version(key) for key in version_keys])
+
+            cached = caches[PAGE_CACHE].get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(_fill_holes(content, request), content_type=content_type)
+
+            request._catalog_page_cache = True
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                request._catalog_page_cache = False
+
+            entry = _cache_entry(response, request)
+            if entry is not None:
+                caches[PAGE_CACHE].set(key, entry, settings.STORE_PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def _acache_catalog_page(view, versions):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await _ais_cacheable(request):
+            return await view(request, *args, **kwargs)
+
+        version_keys = [CATEGORIES_VERSION_KEY] + versions(request, **kwargs)
+        key = _page_key(request, [await _aversion(key) for key in version_keys])
+
+        cached = await caches[PAGE_CACHE].aget(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(_fill_holes(content, request), content_type=content_type)
+
+        request._catalog_page_cache = True
+        try:
+            response = await view(request, *args, **kwargs)
+        finally:
+            request._catalog_page_cache = False
+
+        entry = _cache_entry(response, request)
+        if entry is not None:
+            await caches[PAGE_CACHE].aset(key, entry, settings.STORE_PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapper
@@ -0,0 +1,404 @@
+import secrets
+from contextlib import ExitStack
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+
+def encode_cart(items):
+    """{12: 3, 45: 1} -> '12:3,45:1'"""
+    return ','.join(f'{product_id}:{quantity}' for product_id, quantity in items.items())
+
+
+def decode_cart(value):
+    items = {}
+    if not value:
+        return items
+    for part in value.split(','):
+        product_id, _, quantity = part.partition(':')
+        try:
+            product_id, quantity = int(product_id), int(quantity)
+        except ValueError:
+            continue
+        if quantity > 0:
+            items[product_id] = quantity
+    return items
+
+
+class CartFullError(ValueError):
+    def __init__(self, max_lines):
+        self.max_lines = max_lines
+        super().__init__(f'В корзине может быть не больше {max_lines} разных товаров')
+
+
+class Cart:
+    """Содержимое корзины: product_id -> количество.
+
+    Запоминает, менялась ли корзина, чтобы хранилище записывало её
+    только после реальных изменений.
+    """
+
+    def __init__(self, items=None, max_lines=None):
+        self._items = dict(items or {})
+        self.max_lines = max_lines
+        self.modified = False
+
+    def add(self, product_id, quantity=1):
+        self.set(product_id, self._items.get(int(product_id), 0) + quantity)
+
+    def set(self, product_id, quantity):
+        product_id = int(product_id)
+        if quantity <= 0:
+            self.remove(product_id)
+        elif self._items.get(product_id) != quantity:
+            if product_id not in self._items and self.max_lines is not None and len(self._items) >= self.max_lines:
+                raise CartFullError(self.max_lines)
+            self._items[product_id] = quantity
+            self.modified = True
+
+    def remove(self, product_id):
+        if self._items.pop(int(product_id), None) is not None:
+            self.modified = True
+
+    def clear(self):
+        if self._items:
+            self._items = {}
+            self.modified = True
+
+    @property
+    def count(self):
+        return sum(self._items.values())
+
+    def items(self):
+        return self._items.items()
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, product_id):
+        return int(product_id) in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+
+class BaseCartStorage:
+    # Ограничение числа позиций, если хранилище не вмещает больше
+    max_lines = None
+
+    def __init__(self, request):
+        self.request = request
+
+    def load(self):
+        """Возвращает словарь product_id -> количество"""
+        raise NotImplementedError
+
+    def save(self, items, response):
+        raise NotImplementedError
+
+    # Асинхронные версии для ASGI; по умолчанию синхронные методы в потоке
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, items, response):
+        await sync_to_async(self.save)(items, response)
+
+
+class SessionCartStorage(BaseCartStorage):
+    """Корзина в сессии в компактной строке"""
+
+    session_key = 'cart'
+
+    def load(self):
+        value = self.request.session.get(self.session_key)
+        if isinstance(value, dict):
+            # Старый формат: {product_id: {'name', 'price', 'quantity'}}
+            return {int(pid): int(item['quantity']) for pid, item in value.items()}
+        return decode_cart(value)
+
+    async def aload(self):
+        # Загружает сессию асинхронно; дальше она читается из памяти
+        await self.request.session.aget(self.session_key)
+        return self.load()
+
+    def save(self, items, response):
+        if items:
+            self.request.session[self.session_key] = encode_cart(items)
+        else:
+            self.request.session.pop(self.session_key, None)
+
+    async def asave(self, items, response):
+        self.save(items, response)
+
+
+class CookieCartStorage(BaseCartStorage):
+    """Корзина в подписанной cookie - без записей в базу и кэш"""
+
+    cookie_name = 'cart'
+    salt = 'store.cart'
+
+    @property
+    def max_lines(self):
+        # Браузер молча отбрасывает cookie больше ~4 КБ, а запятые в значении
+        # кодируются как \054 - около 20 байт на позицию
+        return settings.STORE_CART_COOKIE_MAX_LINES
+
+    def load(self):
+        return decode_cart(self.request.get_signed_cookie(self.cookie_name, default=None, salt=self.salt))
+
+    async def aload(self):
+        return self.load()
+
+    def save(self, items, response):
+        if items:
+            response.set_signed_cookie(
+                self.cookie_name, encode_cart(items), salt=self.salt,
+                max_age=settings.STORE_CART_COOKIE_AGE, httponly=True, samesite='Lax'
+            )
+        else:
+            response.delete_cookie(self.cookie_name, samesite='Lax')
+
+    async def asave(self, items, response):
+        self.save(items, response)
+
+
+class CacheCartStorage(BaseCartStorage):
+    """Корзина в кэше, в cookie хранится только случайный идентификатор"""
+
+    cookie_name = 'cart_id'
+
+    def _key(self, cart_id):
+        return f'store:cart:{cart_id}'
+
+    def load(self):
+        cart_id = self.request.COOKIES.get(self.cookie_name)
+        if not cart_id:
+            return {}
+        return decode_cart(cache.get(self._key(cart_id)))
+
+    async def aload(self):
+        cart_id = self.request.COOKIES.get(self.cookie_name)
+        if not cart_id:
+            return {}
+        return decode_cart(await cache.aget(self._key(cart_id)))
+
+    def _new_cart_id(self, response):
+        cart_id = secrets.token_urlsafe(24)
+        response.set_cookie(
+            self.cookie_name, cart_id,
+            max_age=settings.STORE_CART_COOKIE_AGE, httponly=True, samesite='Lax'
+        )
+        return cart_id
+
+    def save(self, items, response):
+        cart_id = self.request.COOKIES.get(self.cookie_name)
+        if not items:
+            if cart_id:
+                cache.delete(self._key(cart_id))
+                response.delete_cookie(self.cookie_name, samesite='Lax')
+            return
+        cart_id = cart_id or self._new_cart_id(response)
+        cache.set(self._key(cart_id), encode_cart(items), settings.STORE_CART_COOKIE_AGE)
+
+    async def asave(self, items, response):
+        cart_id = self.request.COOKIES.get(self.cookie_name)
+        if not items:
+            if cart_id:
+                await cache.adelete(self._key(cart_id))
+                response.delete_cookie(self.cookie_name, samesite='Lax')
+            return
+        cart_id = cart_id or self._new_cart_id(response)
+        await cache.aset(self._key(cart_id), encode_cart(items), settings.STORE_CART_COOKIE_AGE)
+
+
+def get_cart_storage(request):
+    return import_string(settings.STORE_CART_STORAGE)(request)
+
+
+class CartLine:
+    """Позиция корзины с загруженным товаром"""
+
+    __slots__ = ('product', 'quantity', 'total')
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        self.total = product.price * quantity
+
+
+class HydratedCart:
+    """Корзина с товарами из базы, суммами и числом выполненных запросов"""
+
+    def __init__(self, lines, queries):
+        self.lines = lines
+        self.queries = queries
+        self.total = sum((line.total for line in lines), Decimal('0'))
+        self.count = sum(line.quantity for line in lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+CART_ACTIONS = ('add', 'set', 'remove')
+
+
+class CartOperationError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def _parse_operations(operations):
+    if not isinstance(operations, list) or not operations:
+        raise CartOperationError(['Ожидается непустой список операций'])
+    if len(operations) > settings.STORE_CART_BATCH_LIMIT:
+        raise CartOperationError([f'Не больше {settings.STORE_CART_BATCH_LIMIT} операций за запрос'])
+
+    parsed, errors = [], []
+    for i, operation in enumerate(operations):
+        try:
+            action = operation.get('action', 'add')
+            product_id = int(operation['product_id'])
+            quantity = int(operation.get('quantity', 1 if action == 'add' else 0))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            errors.append(f'Операция {i}: неверный формат')
+            continue
+        if action not in CART_ACTIONS:
+            errors.append(f'Операция {i}: неизвестное действие {action}')
+        elif quantity < 0 or (action == 'add' and quantity == 0):
+            errors.append(f'Операция {i}: неверное количество')
+        else:
+            parsed.append((action, product_id, quantity))
+    if errors:
+        raise CartOperationError(errors)
+    return parsed
+
+
+def apply_cart_operations(cart, operations):
+    """Применяет пачку операций add/set/remove к корзине.
+
+    Все товары проверяются одним запросом, который заодно загружает
+    остальную корзину для итогов. При любой ошибке корзина не меняется.
+    Возвращает HydratedCart после изменений.
+    """
+    parsed = _parse_operations(operations)
+    products, queries = count_queries(load_cart_products, set(cart) | {product_id for _, product_id, _ in parsed})
+    return _apply_operations(cart, parsed, products, queries)
+
+
+async def aapply_cart_operations(cart, operations):
+    """Асинхронная версия apply_cart_operations"""
+    parsed = _parse_operations(operations)
+    products, queries = await sync_to_async(count_queries)(
+        load_cart_products, set(cart) | {product_id for _, product_id, _ in parsed}
+    )
+    return _apply_operations(cart, parsed, products, queries)
+
+
+def _apply_operations(cart, parsed, products, queries):
+    # Сначала на копии: при переполнении корзина не должна меняться частично
+    preview = Cart(dict(cart.items()), max_lines=cart.max_lines)
+    try:
+        _run_operations(preview, parsed)
+    except CartFullError as e:
+        raise CartOperationError([str(e)])
+
+    errors = [
+        f'Товар {product_id} недоступен'
+        for action, product_id, _ in parsed
+        if action != 'remove' and (product_id not in products or not products[product_id].available)
+    ]
+    if errors:
+        raise CartOperationError(errors)
+
+    _run_operations(cart, parsed)
+    return build_cart(cart, products, queries=queries)
+
+
+def _run_operations(cart, parsed):
+    for action, product_id, quantity in parsed:
+        if action == 'add':
+            cart.add(product_id, quantity)
+        elif action == 'set':
+            cart.set(product_id, quantity)
+        else:
+            cart.remove(product_id)
+
+
+def load_cart_products(product_ids, queryset=None):
+    """Товары по списку id одним запросом: {id: product}"""
+    if queryset is None:
+        queryset = Product.objects.for_listing()
+    return queryset.order_by().in_bulk([int(product_id) for product_id in product_ids])
+
+
+def count_queries(load, *args):
+    """Вызывает load(*args) и считает его SQL-запросы: (результат, число запросов).
+
+    Обертки ставятся на соединения текущего потока, поэтому асинхронный код
+    вызывает count_queries целиком через sync_to_async.
+    """
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(count))
+        result = load(*args)
+    return result, queries
+
+
+def build_cart(cart, products, queries=0):
+    """Собирает HydratedCart из уже загруженных товаров"""
+    lines, missing = [], []
+    for product_id, quantity in cart.items():
+        product = products.get(int(product_id))
+        if product is None:
+            missing.append(product_id)
+            continue
+        lines.append(CartLine(product, quantity))
+    # Удаленные товары убираем и из самой корзины: строки с ними не видны,
+    # и удалить их вручную нельзя, а оформление заказа бы отклонялось
+    if isinstance(cart, Cart):
+        for product_id in missing:
+            cart.remove(product_id)
+    return HydratedCart(lines, queries=queries)
+
+
+def hydrate_cart(cart, queryset=None):
+    """Загружает товары корзины одним запросом и считает итоги.
+
+    cart - Cart или словарь product_id -> количество.
+    Товары, которых больше нет в базе, пропускаются (и удаляются из Cart).
+    """
+    if not cart:
+        return HydratedCart([], queries=0)
+    products, queries = count_queries(load_cart_products, cart, queryset)
+    return build_cart(cart, products, queries=queries)
+
+
+async def ahydrate_cart(cart, queryset=None):
+    """Асинхронная версия hydrate_cart"""
+    if not cart:
+        return HydratedCart([], queries=0)
+    products, queries = await sync_to_async(count_queries)(load_cart_products, cart, queryset)
+    return build_cart(cart, products, queries=queries)
@@ -0,0 +1,158 @@
+"""
+Массовая загрузка товаров из выгрузки ERP (CSV или JSONL).
+
+Файл читается построчно и обрабатывается пачками: строки пачки проверяются,
+товары вставляются или обновляются по slug одним
+bulk_create(update_conflicts=True), а кэш каталога и индекс поиска
+обновляются один раз на пачку вместо сигналов на каждую строку.
+
+Столбцы: slug (обязателен), name, category (slug категории), description,
+price, stock, available. Пустые ячейки не меняют существующий товар; для
+нового товара нужны name, category и price.
+"""
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .caching import invalidate_products
+from .models import Category, Product
+from .search import reindex_products
+
+FIELDS = ['name', 'category', 'description', 'price', 'stock', 'available']
+REQUIRED_FOR_NEW = ['name', 'category', 'price']
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+BATCH_SIZE = 1000
+# Значения логических столбцов, которые встречаются в выгрузках
+BOOLEANS = {
+    'true': True, '1': True, 'yes': True, 'да': True,
+    'false': False, '0': False, 'no': False, 'нет': False,
+}
+
+
+def detect_format(filename):
+    return FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+def read_rows(stream, fmt):
+    """Пары (номер строки, словарь) из текстового потока; при ошибке разбора вместо словаря - None"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+class ProductImporter:
+    def __init__(self, batch_size=BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        # Все категории в памяти: строки ссылаются на них по slug
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        self.rows = self.created = self.updated = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def run(self, rows):
+        started = time.perf_counter()
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            self.import_batch(batch)
+            self.rows += len(batch)
+        self.elapsed = time.perf_counter() - started
+        return self
+
+    def import_batch(self, batch):
+        slugs = [str(row.get('slug') or '').strip() for _, row in batch if row]
+        # INSERT ... ON CONFLICT проверяет NOT NULL до конфликта, поэтому
+        # обязательные поля существующих товаров берем из базы
+        existing = {
+            slug: {'name': name, 'category_id': category_id, 'price': price}
+            for slug, name, category_id, price in Product.objects.filter(slug__in=slugs)
+            .values_list('slug', 'name', 'category_id', 'price')
+        }
+
+        # Повтор slug внутри пачки: побеждает последняя строка
+        # (ON CONFLICT не может обновить одну строку дважды)
+        products = {}
+        for line, row in batch:
+            try:
+                product, fields = self.build(row, existing)
+            except ValidationError as e:
+                self.errors.append((line, '; '.join(e.messages)))
+                continue
+            products[product.slug] = (product, fields)
+
+        created = sum(1 for slug in products if slug not in existing)
+        self.created += created
+        self.updated += len(products) - created
+        if self.dry_run or not products:
+            return
+
+        # В одном bulk_create набор обновляемых полей общий: группируем строки по нему
+        groups = {}
+        for product, fields in products.values():
+            groups.setdefault(fields, []).append(product)
+        with transaction.atomic():
+            for fields, group in groups.items():
+                Product.objects.bulk_create(
+                    group, update_conflicts=True, unique_fields=['slug'],
+                    update_fields=[Product._meta.get_field(name).attname for name in fields] + ['updated'],
+                )
+            ids = [product.pk for product, _ in products.values()]
+            reindex_products(ids)
+        invalidate_products(ids)
+
+    def build(self, row, existing):
+        """Товар из строки файла и кортеж заданных в ней полей"""
+        if row is None:
+            raise ValidationError('Не удалось разобрать строку')
+        slug = str(row.get('slug') or '').strip()
+        if not slug:
+            raise ValidationError('Не указан slug')
+
+        values = {**existing.get(slug, {}), 'slug': Product._meta.get_field('slug').clean(slug, None)}
+        fields = []
+        for name in FIELDS:
+            value = row.get(name)
+            if value is None or value == '':
+                continue
+            if name == 'category':
+                try:
+                    values['category_id'] = self.categories[str(value).strip()]
+                except KeyError:
+                    raise ValidationError(f'Неизвестная категория: {value}')
+            elif name == 'available' and not isinstance(value, bool):
+                try:
+                    values[name] = BOOLEANS[str(value).strip().lower()]
+                except KeyError:
+                    raise ValidationError(f'Доступен: неверное значение {value}')
+            else:
+                field = Product._meta.get_field(name)
+                try:
+                    values[name] = field.clean(value, None)
+                except ValidationError as e:
+                    raise ValidationError(f'{field.verbose_name}: {"; ".join(e.messages)}')
+            fields.append(name)
+
+        if slug not in existing:
+            missing = [name for name in REQUIRED_FOR_NEW if name not in fields]
+            if missing:
+                raise ValidationError(f'Для нового товара нужны поля: {", ".join(missing)}')
+        return Product(**values), tuple(fields)
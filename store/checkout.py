@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Now
+
+from .caching import invalidate_products
+from .models import Order, OrderItem, Product
+
+# Сколько позиций списывать одним UPDATE
+STOCK_UPDATE_BATCH_SIZE = 100
+
+
+class CheckoutError(Exception):
+    """Заказ не может быть оформлен"""
+
+
+class OutOfStockError(CheckoutError):
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products)
+        super().__init__(f'Недостаточно товара на складе: {names}')
+
+
+def _cart_quantities(cart):
+    return {int(product_id): int(quantity) for product_id, quantity in cart.items()}
+
+
+def _reserve_stock(quantities):
+    """Списывает остатки пачками условных UPDATE ... WHERE stock >= qty.
+
+    Возвращает False, если хотя бы одну позицию списать не удалось.
+    """
+    product_ids = list(quantities)
+    for start in range(0, len(product_ids), STOCK_UPDATE_BATCH_SIZE):
+        batch = product_ids[start:start + STOCK_UPDATE_BATCH_SIZE]
+        condition = Q()
+        whens = []
+        for product_id in batch:
+            condition |= Q(id=product_id, stock__gte=quantities[product_id])
+            whens.append(When(id=product_id, then=F('stock') - quantities[product_id]))
+        # updated входит в ключ фрагмента карточки товара
+        updated = Product.objects.filter(condition).update(stock=Case(*whens), updated=Now())
+        if updated != len(batch):
+            return False
+    return True
+
+
+def place_order(cart, **order_data):
+    """Оформляет заказ по корзине (product_id -> количество) в одной транзакции.
+
+    Товары блокируются одним SELECT ... FOR UPDATE, позиции вставляются
+    через bulk_create, остатки списываются условными UPDATE. При нехватке
+    товара транзакция откатывается и выбрасывается OutOfStockError.
+    """
+    quantities = _cart_quantities(cart)
+    if not quantities:
+        raise CheckoutError('Ваша корзина пуста')
+
+    with transaction.atomic():
+        products = (
+            Product.objects.select_for_update()
+            .filter(available=True)
+            .only('id', 'name', 'price', 'stock', 'image', 'image_variants')
+            .in_bulk(list(quantities))
+        )
+        missing = set(quantities) - set(products)
+        if missing:
+            raise CheckoutError('Некоторые товары из корзины больше недоступны')
+
+        short = [products[pid] for pid, qty in quantities.items() if products[pid].stock < qty]
+        if short:
+            raise OutOfStockError(short)
+
+        total_amount = sum(
+            (products[pid].price * qty for pid, qty in quantities.items()),
+            Decimal('0')
+        )
+        order = Order(total_amount=total_amount, **order_data)
+        order.set_summary((products[pid], qty) for pid, qty in quantities.items())
+        order.save()
+
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[pid], price=products[pid].price, quantity=qty)
+            for pid, qty in quantities.items()
+        ])
+
+        if not _reserve_stock(quantities):
+            # Остатки изменились конкурентной транзакцией - откатываем заказ
+            raise CheckoutError('Остатки товаров изменились, попробуйте оформить заказ ещё раз')
+
+        # UPDATE не вызывает сигналы: сбрасываем кэш каталога сами, после коммита
+        transaction.on_commit(lambda: invalidate_products(quantities))
+
+    return order
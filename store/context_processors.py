@@ -0,0 +1,15 @@
+from django.utils.functional import SimpleLazyObject
+
+from .caching import CART_COUNT_HOLE, CSRF_HOLE, get_categories, is_rendering_for_cache
+
+
+def categories(request):
+    """Категории для навигации на всех страницах магазина"""
+    return {'categories': SimpleLazyObject(get_categories)}
+
+
+def cart(request):
+    """Счётчик корзины; при рендере для кэша страниц - метки вместо данных"""
+    if is_rendering_for_cache(request):
+        return {'cart_count': CART_COUNT_HOLE, 'csrf_token': CSRF_HOLE}
+    return {'cart_count': len(request.cart)}
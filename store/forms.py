@@ -0,0 +1,22 @@
+from django import forms
+
+from .catalog_import import detect_format
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(label="Файл", help_text="CSV или JSONL, столбцы: slug, name, category, description, price, stock, available")
+    format = forms.ChoiceField(
+        label="Формат",
+        choices=[('', 'По расширению файла'), ('csv', 'CSV'), ('jsonl', 'JSONL')],
+        required=False,
+    )
+    dry_run = forms.BooleanField(label="Только проверить", required=False)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = cleaned_data.get('file')
+        if upload and not cleaned_data.get('format'):
+            cleaned_data['format'] = detect_format(upload.name)
+            if cleaned_data['format'] is None:
+                raise forms.ValidationError('Не удалось определить формат по расширению, выберите его')
+        return cleaned_data
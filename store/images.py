@@ -0,0 +1,106 @@
+"""
+Уменьшенные копии изображений товаров.
+
+Для каждого исходного файла создаются варианты шириной STORE_IMAGE_WIDTHS
+в форматах STORE_IMAGE_FORMATS (WebP и JPEG для старых браузеров) рядом с
+оригиналом: products/phone.png -> variants/products/phone-320w.webp.
+Описание созданных вариантов хранится в Product.image_variants, чтобы
+шаблоны строили srcset без обращений к хранилищу.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def variant_name(name, width, fmt):
+    root, _ = os.path.splitext(name)
+    return f'variants/{root}-{width}w.{EXTENSIONS[fmt]}'
+
+
+def variants_are_current(product):
+    return bool(product.image) and product.image_variants.get('source') == product.image.name
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == 'jpeg':
+        if image.mode != 'RGB':
+            # JPEG без прозрачности: подкладываем белый фон
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+            image = background
+        image.save(buffer, 'JPEG', quality=settings.STORE_IMAGE_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=settings.STORE_IMAGE_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def generate_variants(name, storage=default_storage):
+    """Создает варианты изображения name и возвращает их описание для image_variants.
+
+    Варианты шире оригинала не создаются. Возвращает None, если исходный файл
+    не удалось прочитать.
+    """
+    if not storage.exists(name):
+        return None
+    try:
+        with storage.open(name) as f:
+            original = Image.open(f)
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    except (OSError, UnidentifiedImageError) as exc:
+        logger.warning('Не удалось открыть изображение %s: %s', name, exc)
+        return None
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    width, height = original.size
+    widths = [w for w in settings.STORE_IMAGE_WIDTHS if w < width] or [width]
+    sizes = {}
+    for target in widths:
+        resized = original if target == width else original.resize(
+            (target, max(1, round(height * target / width))), Image.LANCZOS
+        )
+        for fmt in settings.STORE_IMAGE_FORMATS:
+            path = variant_name(name, target, fmt)
+            data = _encode(resized, fmt)
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, ContentFile(data))
+            sizes[f'{target}.{fmt}'] = len(data)
+
+    return {
+        'source': name,
+        'width': width,
+        'height': height,
+        'widths': widths,
+        'formats': list(settings.STORE_IMAGE_FORMATS),
+        'bytes': sizes,
+    }
+
+
+def thumbnail_name(product):
+    """Самый маленький вариант последнего формата (JPEG), без вариантов - оригинал"""
+    if not variants_are_current(product):
+        return product.image.name
+    variants = product.image_variants
+    return variant_name(variants['source'], variants['widths'][0], variants['formats'][-1])
+
+
+def srcset(product, fmt):
+    variants = product.image_variants
+    return ', '.join(
+        f'{product.image.storage.url(variant_name(variants["source"], width, fmt))} {width}w'
+        for width in variants['widths']
+    )
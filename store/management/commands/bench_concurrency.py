@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from store.models import Product
+
+from .bench_journeys import percentile
+
+SERVERS = {
+    'sync': ('shop.wsgi:application', 'sync', '0'),
+    'async': ('shop.asgi:application', 'uvicorn_worker.UvicornWorker', '1'),
+}
+
+
+async def fetch(host, port, path, slow_ms):
+    """Один GET в отдельном соединении; возвращает (статус, мс)"""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'.encode())
+        await writer.drain()
+        if slow_ms:
+            # Медленный клиент: заголовки приходят не сразу
+            await asyncio.sleep(slow_ms / 1000)
+        writer.write(b'Connection: close\r\n\r\n')
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    status = int(status_line.split()[1]) if status_line else 0
+    return status, (time.perf_counter() - started) * 1000
+
+
+async def run_load(host, port, paths, connections, requests, slow_ms):
+    results = []
+
+    async def client(number):
+        for i in range(requests):
+            path = paths[(number + i) % len(paths)]
+            try:
+                results.append(await fetch(host, port, path, slow_ms))
+            except OSError:
+                results.append((0, 0.0))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(connections)))
+    return results, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность gunicorn с синхронными рабочими '
+        'процессами (shop.wsgi) и с рабочими процессами uvicorn (shop.asgi, '
+        'асинхронные представления) при большом числе одновременных соединений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=50, help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=20, help='Запросов на клиента')
+        parser.add_argument('--slow-client-ms', type=int, default=0,
+                            help='Задержка клиента между частями заголовков')
+        parser.add_argument('--workers', type=int, default=2, help='Рабочих процессов gunicorn')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--modes', default='sync,async', help='sync, async или оба через запятую')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        product = Product.objects.filter(available=True).only('id', 'slug').order_by('id').first()
+        if product is None:
+            raise CommandError('Нет доступных товаров: сначала заполните базу (manage.py populate_db)')
+        paths = [
+            reverse('store:product_list'),
+            reverse('store:product_detail', args=[product.id, product.slug]),
+            reverse('store:cart_detail'),
+        ]
+
+        results = {}
+        for mode in options['modes'].split(','):
+            if mode not in SERVERS:
+                raise CommandError(f'Неизвестный режим: {mode}')
+            with self.server(mode, options):
+                responses, elapsed = asyncio.run(run_load(
+                    '127.0.0.1', options['port'], paths,
+                    options['connections'], options['requests'], options['slow_client_ms'],
+                ))
+            results[mode] = self.summarize(responses, elapsed)
+
+        self.print_table(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'options': {key: options[key] for key in (
+                    'connections', 'requests', 'slow_client_ms', 'workers'
+                )}, 'results': results}, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    def server(self, mode, options):
+        app, worker_class, async_views = SERVERS[mode]
+        env = dict(os.environ, STORE_ASYNC_VIEWS=async_views)
+        process = subprocess.Popen([
+            # gunicorn.conf.py рассчитан на сервер (сокет, логи, пользователь) - не читаем его
+            sys.executable, '-m', 'gunicorn', app, '--config', os.devnull,
+            '--bind', f'127.0.0.1:{options["port"]}',
+            '--workers', str(options['workers']),
+            '--worker-class', worker_class,
+            '--log-level', 'warning',
+        ], cwd=settings.BASE_DIR, env=env)
+        return RunningServer(process, options['port'])
+
+    def summarize(self, responses, elapsed):
+        latencies = [ms for status, ms in responses if status == 200]
+        errors = sum(1 for status, _ in responses if status != 200)
+        summary = {
+            'requests': len(responses),
+            'errors': errors,
+            'rps': round(len(latencies) / elapsed, 1),
+        }
+        if latencies:
+            summary.update({
+                'p50_ms': round(percentile(latencies, 50), 1),
+                'p95_ms': round(percentile(latencies, 95), 1),
+                'p99_ms': round(percentile(latencies, 99), 1),
+            })
+        return summary
+
+    def print_table(self, results):
+        self.stdout.write(f'{"Режим":<8}{"запросы":>9}{"ошибки":>8}{"RPS":>9}{"p50":>9}{"p95":>9}{"p99":>9}')
+        for mode, stats in results.items():
+            self.stdout.write(
+                f'{mode:<8}{stats["requests"]:>9}{stats["errors"]:>8}{stats["rps"]:>9}'
+                f'{stats.get("p50_ms", "-"):>9}{stats.get("p95_ms", "-"):>9}{stats.get("p99_ms", "-"):>9}'
+            )
+
+
+class RunningServer:
+    """Запущенный gunicorn: ждет открытия порта и останавливает процесс на выходе"""
+
+    def __init__(self, process, port, timeout=30):
+        self.process = process
+        self.port = port
+        self.timeout = timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError('gunicorn завершился при запуске (установлены ли gunicorn и uvicorn-worker?)')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError('gunicorn не начал принимать соединения')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
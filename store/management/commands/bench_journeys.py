@@ -0,0 +1,230 @@
+import json
+import math
+import random
+import subprocess
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve, reverse
+from django.utils import timezone
+
+from store.caching import invalidate_products
+from store.checkout import place_order
+from store.models import Order, Product
+
+# Пароль не похож на имя пользователя, иначе регистрацию отклонит
+# UserAttributeSimilarityValidator
+BENCH_PASSWORD = 'Kx9#mTq2!vLw'
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    latencies = [sample['ms'] for sample in samples]
+    queries = [sample['queries'] for sample in samples]
+    sizes = [sample['bytes'] for sample in samples]
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p90_ms': round(percentile(latencies, 90), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'bytes_mean': round(sum(sizes) / len(sizes)),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные сценарии покупателя через тестовый клиент Django на '
+        'текущей базе и сохраняет перцентили времени, число запросов и размер '
+        'ответов в JSON. Созданные заказы и пользователи по умолчанию удаляются, '
+        'остатки товаров восстанавливаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--host', default='localhost', help='Заголовок Host для запросов')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения p95')
+        parser.add_argument('--clear-cache', action='store_true', help='Очистить кэш перед прогоном')
+        parser.add_argument('--keep', action='store_true', help='Не удалять созданные данные')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.host = options['host']
+        self.samples = defaultdict(list)
+        self.product_ids = list(
+            Product.objects.filter(available=True, stock__gt=0).order_by('id').values_list('id', flat=True)[:1000]
+        )
+        if not self.product_ids:
+            raise CommandError('Нет доступных товаров: сначала заполните базу (manage.py populate_db)')
+        if options['clear_cache']:
+            cache.clear()
+
+        # Без общей транзакции: замеряется и коммит заказа, и сброс кэша после него
+        snapshot = self.snapshot()
+        try:
+            for i in range(options['warmup']):
+                self.run_journeys(f'w{i}', record=False)
+            for i in range(options['iterations']):
+                self.run_journeys(str(i), record=True)
+        finally:
+            if not options['keep']:
+                self.restore(snapshot)
+
+        results = {
+            'revision': git_revision(),
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'steps': {step: summarize(samples) for step, samples in self.samples.items()},
+        }
+        self.print_table(results, self.load(options['compare']))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    def snapshot(self):
+        User = get_user_model()
+        return {
+            'order_id': Order.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+            'user_id': User.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+            'stock': dict(Product.objects.filter(id__in=self.product_ids).values_list('id', 'stock')),
+        }
+
+    def restore(self, snapshot):
+        """Удаляет заказы и пользователей прогона и возвращает списанные остатки"""
+        Order.objects.filter(id__gt=snapshot['order_id']).delete()
+        get_user_model().objects.filter(id__gt=snapshot['user_id']).delete()
+        current = dict(Product.objects.filter(id__in=snapshot['stock']).values_list('id', 'stock'))
+        changed = [
+            Product(id=product_id, stock=stock)
+            for product_id, stock in snapshot['stock'].items() if current.get(product_id, stock) != stock
+        ]
+        Product.objects.bulk_update(changed, ['stock'], batch_size=500)
+        invalidate_products([product.id for product in changed])
+
+    def load(self, path):
+        if not path:
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def request(self, client, step, method, url, record, redirect_to=None, **kwargs):
+        """Выполняет шаг и проверяет ответ: 200 или редирект на представление redirect_to.
+
+        Иначе замер пришелся бы на другую страницу (форму с ошибками, вход).
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, **kwargs)
+            elapsed = (time.perf_counter() - started) * 1000
+        expected = 302 if redirect_to else 200
+        if response.status_code != expected:
+            raise CommandError(f'{step}: {method.upper()} {url} вернул {response.status_code}, ожидался {expected}')
+        if redirect_to:
+            try:
+                target = resolve(response['Location'].split('?')[0]).view_name
+            except Resolver404:
+                target = None
+            if target != redirect_to:
+                raise CommandError(f'{step}: {method.upper()} {url} перенаправил на {response["Location"]}')
+        if record:
+            self.samples[step].append({
+                'ms': elapsed,
+                'queries': len(ctx.captured_queries),
+                'bytes': len(response.content),
+            })
+        return response
+
+    def run_journeys(self, suffix, record):
+        self.shopping_journey(record)
+        self.account_journey(suffix, record)
+
+    def shopping_journey(self, record):
+        client = Client(HTTP_HOST=self.host)
+        product = Product.objects.only('id', 'slug').get(id=self.rng.choice(self.product_ids))
+
+        self.request(client, 'browse', 'get', reverse('store:product_list'), record)
+        self.request(client, 'product_detail', 'get',
+                     reverse('store:product_detail', args=[product.id, product.slug]), record)
+        self.request(client, 'add_to_cart', 'post', reverse('store:add_to_cart'), record,
+                     data={'product_id': product.id, 'quantity': 1}, content_type='application/json')
+        self.request(client, 'cart_detail', 'get', reverse('store:cart_detail'), record)
+        self.request(client, 'order_create_form', 'get', reverse('store:order_create'), record)
+        response = self.request(client, 'order_create', 'post', reverse('store:order_create'), record, data={
+            'address': 'г. Москва, ул. Тестовая, д. 1',
+            'customer_name': 'Нагрузочный тест',
+            'customer_email': 'bench@example.com',
+            'customer_phone': '+79990000000',
+        }, redirect_to='store:order_success')
+        self.request(client, 'order_success', 'get', response['Location'], record)
+
+    def account_journey(self, suffix, record):
+        client = Client(HTTP_HOST=self.host)
+        User = get_user_model()
+        phone = f'+7955{self.rng.randrange(10 ** 7):07d}'
+        while User.objects.filter(phone_number=phone).exists():
+            phone = f'+7955{self.rng.randrange(10 ** 7):07d}'
+        password = BENCH_PASSWORD
+
+        self.request(client, 'register', 'post', reverse('accounts:register'), record, data={
+            'phone_number': phone,
+            'username': f'bench-{suffix}-{phone[-7:]}',
+            'password1': password,
+            'password2': password,
+        }, redirect_to='store:product_list')
+        client.logout()
+        self.request(client, 'login', 'post', reverse('accounts:login'), record,
+                     redirect_to='store:product_list', data={'username': phone, 'password': password})
+        user = client.session.get('_auth_user_id')
+        if user is None:
+            raise CommandError('Не удалось войти в аккаунт в сценарии регистрации')
+
+        # Заказ для страницы деталей создаём напрямую, это не часть замера
+        order = place_order({self.rng.choice(self.product_ids): 1}, user_id=user, address='Адрес')
+
+        self.request(client, 'profile', 'get', reverse('accounts:profile'), record)
+        self.request(client, 'order_detail', 'get', reverse('accounts:order_detail', args=[order.id]), record)
+
+    def print_table(self, results, previous):
+        header = f'{"Шаг":<20}{"p50":>9}{"p95":>9}{"p99":>9}{"запросы":>9}{"байты":>10}'
+        if previous:
+            header += f'{"Δp95":>10}'
+        self.stdout.write(header)
+        for step, stats in results['steps'].items():
+            line = (f'{step:<20}{stats["p50_ms"]:>9}{stats["p95_ms"]:>9}{stats["p99_ms"]:>9}'
+                    f'{stats["queries_mean"]:>9}{stats["bytes_mean"]:>10}')
+            old = previous and previous['steps'].get(step)
+            if old:
+                delta = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+                line += f'{delta:>+9.1f}%'
+            self.stdout.write(line)
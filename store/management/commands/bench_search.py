@@ -0,0 +1,60 @@
+import time
+from functools import reduce
+from operator import and_
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+from store.models import Product
+from store.search import SearchResults, query_terms
+
+from .bench_journeys import percentile
+
+QUERIES = ['ноутбук', 'умный чайник', 'noutbuk', 'рюкзаки походные', 'свитер 42', 'термос стальной']
+
+
+def search_index(query, per_page):
+    page = Paginator(SearchResults(query), per_page).get_page(1)
+    return list(page.object_list), page.paginator.count
+
+
+def search_like(query, per_page):
+    # Прежний способ: LIKE '%слово%' по названию и описанию, как search_fields админки
+    condition = reduce(and_, (
+        Q(name__icontains=term) | Q(description__icontains=term) for term in query_terms(query)
+    ))
+    products = Product.objects.for_listing().filter(condition, available=True).order_by('name', 'id')
+    count = products[:settings.STORE_SEARCH_MAX_RESULTS].count()
+    return list(products[:per_page]), count
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время поиска по индексу и через LIKE на текущей базе.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help='Запросы (по умолчанию - набор из команды)')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--per-page', type=int, default=settings.STORE_PAGE_SIZE)
+        parser.add_argument('--skip-like', action='store_true', help='Не замерять LIKE (долго на больших базах)')
+
+    def handle(self, *args, **options):
+        if not Product.objects.exists():
+            raise CommandError('Нет товаров: сначала заполните базу (manage.py populate_db)')
+        modes = {'index': search_index}
+        if not options['skip_like']:
+            modes['like'] = search_like
+
+        self.stdout.write(f'{"Запрос":<22}{"режим":<7}{"найдено":>9}{"p50":>9}{"p95":>9}{"p99":>9}')
+        for query in options['queries'] or QUERIES:
+            for mode, func in modes.items():
+                latencies = []
+                for _ in range(options['iterations']):
+                    started = time.perf_counter()
+                    _, count = func(query, options['per_page'])
+                    latencies.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f'{query:<22}{mode:<7}{count:>9}{percentile(latencies, 50):>9.1f}'
+                    f'{percentile(latencies, 95):>9.1f}{percentile(latencies, 99):>9.1f}'
+                )
@@ -0,0 +1,113 @@
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers import sort_dependencies
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.utils import load_backend
+
+from store.utils import explicit_dates
+
+SOURCE_ALIAS = 'copy_source'
+
+
+def models_to_copy():
+    """Модели в порядке зависимостей, промежуточные таблицы M2M - в конце"""
+    app_list = [(app_config, None) for app_config in apps.get_app_configs() if app_config.models_module]
+    models = [
+        model for model in sort_dependencies(app_list, allow_cycles=True)
+        if model._meta.managed and not model._meta.proxy
+    ]
+    through = [
+        field.remote_field.through
+        for model in models
+        for field in model._meta.local_many_to_many
+        if field.remote_field.through._meta.auto_created
+    ]
+    return models + through
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит все данные из файла SQLite в базу --database (обычно PostgreSQL) '
+        'пачками bulk_create с сохранением первичных ключей и дат, затем '
+        'сбрасывает последовательности. База назначения должна быть пустой '
+        'и с примененными миграциями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(settings.BASE_DIR / 'db.sqlite3'),
+                            help='Путь к исходному файлу SQLite')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Псевдоним базы назначения')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        target = options['database']
+        if not os.path.exists(options['source']):
+            raise CommandError(f'Файл {options["source"]} не найден')
+        if str(connections[target].settings_dict['NAME']) == options['source']:
+            raise CommandError('Источник и база назначения совпадают')
+        self.open_source(options['source'])
+        try:
+            self.copy_all(target, options)
+        finally:
+            connections[SOURCE_ALIAS].close()
+            del connections[SOURCE_ALIAS]
+
+    def copy_all(self, target, options):
+        models = models_to_copy()
+        # Типы содержимого и права создает migrate, их заменяем данными источника
+        generated = {ContentType, Permission}
+        for model in models:
+            if model not in generated and model._base_manager.using(target).exists():
+                raise CommandError(f'Таблица {model._meta.db_table} в базе назначения не пуста')
+
+        started = time.monotonic()
+        # Внешние ключи в SQLite и PostgreSQL проверяются при фиксации транзакции
+        with transaction.atomic(using=target), explicit_dates(*models):
+            Permission.objects.using(target).all().delete()
+            ContentType.objects.using(target).all().delete()
+            for model in models:
+                copied = self.copy(model, target, options['batch_size'])
+                self.stdout.write(f'{model._meta.label}: {copied}')
+            self.reset_sequences(target, models)
+        # Индекс поиска не модель и не копируется: строим его по перенесенным товарам
+        call_command('rebuild_search_index', database=target, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.monotonic() - started:.1f} с'))
+
+    def open_source(self, path):
+        # Источник не обязан быть описан в DATABASES: соединение создается только
+        # на время команды и не попадает в общие настройки
+        settings_dict = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            SOURCE_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+        })[SOURCE_ALIAS]
+        connections[SOURCE_ALIAS] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, SOURCE_ALIAS)
+
+    def copy(self, model, target, batch_size):
+        manager = model._base_manager
+        batch = []
+        copied = 0
+        for obj in manager.using(SOURCE_ALIAS).order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                manager.using(target).bulk_create(batch)
+                copied += len(batch)
+                batch = []
+        if batch:
+            manager.using(target).bulk_create(batch)
+            copied += len(batch)
+        return copied
+
+    def reset_sequences(self, target, models):
+        connection = connections[target]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
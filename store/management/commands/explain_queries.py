@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from store.models import Category, Order, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы выполнения основных запросов магазина. '
+        'С --without-indexes индексы из Meta.indexes временно удаляются '
+        'в транзакции, чтобы сравнить планы до и после.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--without-indexes', action='store_true',
+                            help='Выполнить EXPLAIN без составных индексов (изменения откатываются)')
+        parser.add_argument('--analyze', action='store_true',
+                            help='EXPLAIN ANALYZE (только PostgreSQL)')
+
+    def get_queries(self):
+        category = Category.objects.order_by('id').first()
+        user_id = Order.objects.filter(user__isnull=False).values_list('user_id', flat=True).first()
+        since = timezone.now() - timedelta(days=30)
+        catalog = Product.objects.for_listing().filter(available=True)
+        return [
+            ('Каталог: первая страница', catalog.order_by('name', 'id')[:24]),
+            ('Каталог: категория', catalog.filter(category=category).order_by('name', 'id')[:24]),
+            ('Каталог: количество товаров', catalog.order_by().values('id')),
+            ('Профиль: заказы пользователя', Order.objects.filter(user_id=user_id).order_by('-created')[:20]),
+            ('Админка: заказы по статусу и дате',
+             Order.objects.filter(status='paid', created__gte=since).order_by('-created')[:100]),
+        ]
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (Product, Order):
+                for index in model._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options['analyze'] = True
+
+        with transaction.atomic():
+            if options['without_indexes']:
+                self.drop_indexes()
+                self.stdout.write(self.style.WARNING('Индексы временно удалены\n'))
+
+            for title, queryset in self.get_queries():
+                self.stdout.write(self.style.MIGRATE_HEADING(title))
+                self.stdout.write(str(queryset.query))
+                self.stdout.write(queryset.explain(**explain_options))
+                self.stdout.write('')
+
+            # Ничего не сохраняем: удаление индексов откатывается
+            transaction.set_rollback(True)
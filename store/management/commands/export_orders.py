@@ -0,0 +1,54 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.export import CHUNK_SIZE, FORMATS, export_lines, filter_orders
+from store.models import Order
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Неверная дата: {value} (нужен формат ГГГГ-ММ-ДД)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает позиции заказов с данными заказа и товара в CSV или '
+        'JSONL. Память не зависит от числа строк.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--from', dest='date_from', help='Начальная дата заказа включительно, ГГГГ-ММ-ДД')
+        parser.add_argument('--to', dest='date_to', help='Конечная дата заказа включительно, ГГГГ-ММ-ДД')
+        parser.add_argument('--status', action='append', dest='statuses',
+                            choices=[status for status, _ in Order.STATUS_CHOICES],
+                            help='Статус заказа, можно указать несколько раз')
+        parser.add_argument('--output', help='Файл для выгрузки (по умолчанию stdout)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Строк, читаемых из базы за раз')
+
+    def handle(self, *args, **options):
+        orders = filter_orders(
+            Order.objects.all(),
+            date_from=options['date_from'] and parse_date(options['date_from']),
+            date_to=options['date_to'] and parse_date(options['date_to']),
+            statuses=options['statuses'],
+        )
+        lines = export_lines(orders, options['format'], options['chunk_size'])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            for line in lines:
+                f.write(line)
+                count += 1
+        if options['format'] == 'csv':
+            count -= 1  # заголовок
+        self.stderr.write(f'Выгружено позиций: {count} в {options["output"]}')
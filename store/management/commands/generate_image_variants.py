@@ -0,0 +1,85 @@
+import multiprocessing
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from store.caching import invalidate_products
+from store.images import generate_variants
+from store.models import Product
+
+
+def _close_connections():
+    # Дочерние процессы не должны использовать соединение родителя
+    connections.close_all()
+
+
+def _generate(name):
+    return name, generate_variants(name)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает уменьшенные копии (WebP и JPEG нескольких ширин) для изображений '
+        'товаров, у которых их еще нет. Одинаковые файлы обрабатываются один раз.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать варианты для всех товаров')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Процессов для обработки изображений')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Товаров в одном bulk_update')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').only('id', 'image', 'image_variants')
+        names = {
+            name for name, variants in products.values_list('image', 'image_variants').iterator()
+            if options['force'] or variants.get('source') != name
+        }
+        if not names:
+            self.stdout.write('Все варианты изображений актуальны')
+            return
+
+        if options['workers'] > 1 and len(names) > 1:
+            _close_connections()
+            with multiprocessing.Pool(options['workers'], initializer=_close_connections) as pool:
+                results = dict(pool.imap_unordered(_generate, sorted(names)))
+        else:
+            results = dict(map(_generate, sorted(names)))
+
+        variants = {name: result for name, result in results.items() if result is not None}
+        for name in sorted(names - variants.keys()):
+            self.stderr.write(f'Не удалось обработать {name}')
+
+        updated = self.save_variants(products.filter(image__in=variants), variants, options['batch_size'])
+
+        original = variant_bytes = 0
+        for name, result in variants.items():
+            original += default_storage.size(name)
+            # Браузер скачивает один вариант: считаем самый крупный первого формата
+            fmt = result['formats'][0]
+            variant_bytes += result['bytes'][f'{result["widths"][-1]}.{fmt}']
+        self.stdout.write(self.style.SUCCESS(
+            f'Изображений: {len(variants)}, товаров обновлено: {updated}. '
+            f'Оригиналы: {original} байт, крупнейшие варианты: {variant_bytes} байт'
+        ))
+
+    def save_variants(self, products, variants, batch_size):
+        updated = last_id = 0
+        products = products.order_by('id')
+        # Пачками по id: SQLite не дает безопасно менять таблицу под открытым курсором
+        while batch := list(products.filter(id__gt=last_id)[:batch_size]):
+            now = timezone.now()
+            for product in batch:
+                product.image_variants = variants[product.image.name]
+                # updated входит в ключ кэша карточки товара
+                product.updated = now
+            with transaction.atomic():
+                Product.objects.bulk_update(batch, ['image_variants', 'updated'])
+            invalidate_products([product.id for product in batch])
+            updated += len(batch)
+            last_id = batch[-1].id
+        return updated
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_import import BATCH_SIZE, ProductImporter, detect_format, read_rows
+
+# Сколько ошибок выводить подробно
+MAX_REPORTED_ERRORS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает товары из CSV или JSONL: вставляет новые и обновляет '
+        'существующие по slug пачками bulk_create(update_conflicts=True).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .csv, .jsonl или .ndjson')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Формат, если не ясен из расширения')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить строки')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        if fmt is None:
+            raise CommandError('Не удалось определить формат по расширению, укажите --format')
+        try:
+            # utf-8-sig: Excel добавляет BOM в начало CSV
+            with open(options['path'], encoding='utf-8-sig', newline='') as f:
+                importer = ProductImporter(options['batch_size'], options['dry_run']).run(read_rows(f, fmt))
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать файл: {e}')
+
+        for line, message in importer.errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f'Строка {line}: {message}')
+        if len(importer.errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write(f'... и еще {len(importer.errors) - MAX_REPORTED_ERRORS} ошибок')
+
+        prefix = 'Проверено (без записи)' if options['dry_run'] else 'Загружено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}: строк {importer.rows}, новых {importer.created}, обновлено {importer.updated}, '
+            f'ошибок {len(importer.errors)} за {importer.elapsed:.1f} с '
+            f'({importer.rows_per_second:.0f} строк/с)'
+        ))
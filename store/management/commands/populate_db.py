@@ -0,0 +1,237 @@
+import multiprocessing
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from store.models import Category, Order, OrderItem, Product
+from store.search import index_products
+from store.utils import create_slug, explicit_dates
+
+ADJECTIVES = [
+    'Умный', 'Компактный', 'Профессиональный', 'Складной', 'Беспроводной',
+    'Детский', 'Классический', 'Спортивный', 'Электрический', 'Походный',
+    'Кожаный', 'Стальной', 'Деревянный', 'Мягкий', 'Летний', 'Зимний',
+]
+NOUNS = [
+    'чайник', 'рюкзак', 'фонарь', 'стол', 'наушник', 'зонт', 'свитер',
+    'велосипед', 'пылесос', 'конструктор', 'блокнот', 'ноутбук', 'плед',
+    'термос', 'коврик', 'светильник', 'самокат', 'чемодан', 'шлем',
+]
+DESCRIPTIONS = [
+    'Высокое качество по доступной цене. Отличный выбор для повседневного использования.',
+    'Современный дизайн и функциональность. Подходит для активного образа жизни.',
+    'Надежный и долговечный товар. Гарантия качества от производителя.',
+    'Компактные размеры и удобство использования. Отлично подходит для путешествий.',
+    'Профессиональное качество. Используется специалистами в своей области.',
+]
+STATUSES = [status for status, _ in Order.STATUS_CHOICES]
+# Максимум параметров в одном запросе id__in для старых версий SQLite
+IN_BATCH = 900
+
+
+def chunk_rng(seed, kind, start):
+    """Генератор случайных чисел, зависящий только от seed и номера первой строки пачки"""
+    return random.Random(f'{seed}:{kind}:{start}')
+
+
+def fetch_products(product_ids):
+    """Цены, названия и изображения товаров для позиций и сводки заказа"""
+    products = {}
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), IN_BATCH):
+        products.update(
+            Product.objects.only('id', 'name', 'price', 'image', 'image_variants')
+            .in_bulk(product_ids[start:start + IN_BATCH])
+        )
+    return products
+
+
+def generate_products(start, end, options, context):
+    rng = chunk_rng(options['seed'], 'products', start)
+    now = timezone.now()
+    products = []
+    for i in range(start, end):
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i + 1}'
+        stock = rng.randint(0, 100)
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 730))
+        products.append(Product(
+            category_id=rng.choice(context['category_ids']),
+            name=name,
+            slug=create_slug(name),
+            description=rng.choice(DESCRIPTIONS),
+            price=Decimal(rng.randint(500, 50000)),
+            stock=stock,
+            available=stock > 0,
+            created=created,
+            updated=created,
+        ))
+    with transaction.atomic(), explicit_dates(Product):
+        Product.objects.bulk_create(products, batch_size=options['batch_size'])
+        # bulk_create не отправляет post_save - индекс поиска обновляем сами
+        index_products(products)
+    return end - start
+
+
+def generate_users(start, end, options, context):
+    users = [
+        CustomUser(
+            username=f'user{i + 1}',
+            phone_number=f'+7900{i + 1:07d}',
+            email=f'user{i + 1}@example.com',
+            password=context['password'],
+        )
+        for i in range(start, end)
+    ]
+    CustomUser.objects.bulk_create(users, batch_size=options['batch_size'])
+    return end - start
+
+
+def generate_orders(start, end, options, context):
+    rng = chunk_rng(options['seed'], 'orders', start)
+    now = timezone.now()
+    min_product, max_product = context['product_range']
+    min_user, max_user = context['user_range'] or (None, None)
+
+    plans = []
+    for i in range(start, end):
+        lines = {
+            rng.randint(min_product, max_product): rng.randint(1, 5)
+            for _ in range(rng.randint(1, options['items_per_order']))
+        }
+        user_id = rng.randint(min_user, max_user) if min_user and rng.random() < 0.7 else None
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 730))
+        plans.append((i, lines, user_id, created, rng.choice(STATUSES)))
+
+    products = fetch_products({pid for _, lines, _, _, _ in plans for pid in lines})
+
+    orders = []
+    for i, lines, user_id, created, status in plans:
+        lines = {pid: qty for pid, qty in lines.items() if pid in products}
+        total = sum((products[pid].price * qty for pid, qty in lines.items()), Decimal('0'))
+        order = Order(
+            user_id=user_id,
+            customer_name='' if user_id else f'Покупатель {i + 1}',
+            customer_email='' if user_id else f'guest{i + 1}@example.com',
+            customer_phone='' if user_id else f'+7911{i + 1:07d}',
+            address=f'г. Москва, ул. Тестовая, д. {i % 200 + 1}',
+            total_amount=total,
+            status=status,
+            created=created,
+            updated=created,
+        )
+        order.set_summary((products[pid], qty) for pid, qty in lines.items())
+        orders.append(order)
+
+    with transaction.atomic(), explicit_dates(Order):
+        Order.objects.bulk_create(orders, batch_size=options['batch_size'])
+        items = [
+            OrderItem(order_id=order.id, product_id=pid, price=products[pid].price, quantity=qty)
+            for order, (_, lines, _, _, _) in zip(orders, plans)
+            for pid, qty in lines.items()
+            if pid in products
+        ]
+        OrderItem.objects.bulk_create(items, batch_size=options['batch_size'])
+    return end - start
+
+
+def _close_connections():
+    # Дочерние процессы не должны использовать соединение родителя
+    connections.close_all()
+
+
+def _run_chunk(task):
+    func, start, end, options, context = task
+    return func(start, end, options, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует большой детерминированный набор данных для нагрузочного '
+        'тестирования: категории, товары, пользователей, заказы и позиции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--orders', type=int, default=100_000)
+        parser.add_argument('--items-per-order', type=int, default=5,
+                            help='Максимальное количество позиций в заказе')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Строк в одной пачке bulk_create')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Процессов для генерации пачек (имеет смысл на PostgreSQL)')
+
+    def handle(self, *args, **options):
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite допускает только одного писателя - генерация будет в одном процессе'
+            ))
+            options['workers'] = 1
+
+        categories = self.create_categories(options)
+        context = {'category_ids': [category.id for category in categories]}
+
+        self.run('Товары', generate_products, options['products'], Product.objects.count(), options, context)
+
+        context['password'] = make_password('password')
+        self.run('Пользователи', generate_users, options['users'], CustomUser.objects.count(), options, context)
+
+        context['product_range'] = self.id_range(Product)
+        context['user_range'] = self.id_range(CustomUser)
+        if context['product_range']:
+            self.run('Заказы', generate_orders, options['orders'], Order.objects.count(), options, context)
+
+    def create_categories(self, options):
+        existing = Category.objects.count()
+        categories = []
+        for i in range(existing, existing + options['categories']):
+            name = f'Категория {i + 1}'
+            categories.append(Category(name=name, slug=create_slug(name)))
+        Category.objects.bulk_create(categories, batch_size=options['batch_size'])
+        self.stdout.write(f'Создано категорий: {len(categories)}')
+        return list(Category.objects.only('id'))
+
+    def id_range(self, model):
+        ids = model.objects.order_by('id').values_list('id', flat=True)
+        first = ids.first()
+        if first is None:
+            return None
+        return first, ids.last()
+
+    def run(self, title, func, count, offset, options, context):
+        if count <= 0:
+            return
+        batch_size = options['batch_size']
+        tasks = [
+            (func, start, min(start + batch_size, offset + count), options, context)
+            for start in range(offset, offset + count, batch_size)
+        ]
+
+        started = time.monotonic()
+        done = 0
+        if options['workers'] > 1:
+            _close_connections()
+            with multiprocessing.Pool(options['workers'], initializer=_close_connections) as pool:
+                for created in pool.imap_unordered(_run_chunk, tasks):
+                    done += created
+                    self.progress(title, done, count, started)
+        else:
+            for task in tasks:
+                done += _run_chunk(task)
+                self.progress(title, done, count, started)
+        self.stdout.write('')
+
+    def progress(self, title, done, count, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'\r{title}: {done}/{count} ({rate:.0f} строк/с)', ending='')
+        self.stdout.flush()
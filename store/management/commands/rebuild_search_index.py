@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from store.models import Product
+from store.search import get_backend
+
+
+class Command(BaseCommand):
+    help = (
+        'Полностью перестраивает индекс поиска по товарам. Нужен после загрузки '
+        'товаров в обход сигналов (queryset.update, bulk_update, SQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        backend = get_backend(connections[using])
+        rows = Product.objects.using(using).order_by('id').values_list('id', 'name', 'description')
+
+        started = time.perf_counter()
+        indexed = last_id = 0
+        with transaction.atomic(using=using):
+            backend.create()
+            backend.clear()
+            while batch := list(rows.filter(id__gt=last_id)[:options['batch_size']]):
+                backend.index(batch)
+                indexed += len(batch)
+                last_id = batch[-1][0]
+        backend.optimize()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано товаров: {indexed} за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from shop.database import SQLITE_BUSY_TIMEOUT, TUNED_SQLITE_PRAGMAS
+from store.models import Product
+
+ORDER_DATA = {
+    'address': 'г. Москва, ул. Нагрузочная, д. 1',
+    'customer_name': 'Нагрузочный тест',
+    'customer_email': 'stress@example.com',
+    'customer_phone': '+79990000000',
+}
+
+
+def _init_worker(path, tuned):
+    # Каждый процесс - отдельное соединение, как у рабочего процесса gunicorn
+    connections.close_all()
+    database = connections['default'].settings_dict
+    database['NAME'] = path
+    if tuned:
+        database['OPTIONS'] = {'transaction_mode': 'IMMEDIATE', 'timeout': SQLITE_BUSY_TIMEOUT / 1000}
+        settings.SQLITE_PRAGMAS = dict(TUNED_SQLITE_PRAGMAS)
+    else:
+        database['OPTIONS'] = {}
+        settings.SQLITE_PRAGMAS = {}
+
+
+def _checkout_worker(task):
+    worker, orders, product_ids, host = task
+    results = Counter()
+    latencies = []
+    client = Client(HTTP_HOST=host)
+    for i in range(orders):
+        product_id = product_ids[(worker + i) % len(product_ids)]
+        started = time.perf_counter()
+        try:
+            client.post(reverse('store:add_to_cart'), {'product_id': product_id, 'quantity': 1},
+                        content_type='application/json')
+            response = client.post(reverse('store:order_create'), ORDER_DATA)
+        except OperationalError as exc:
+            results['locked' if 'locked' in str(exc) else 'db_error'] += 1
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        results['ok' if response.status_code == 302 else f'http_{response.status_code}'] += 1
+    connections.close_all()
+    return results, latencies
+
+
+class Command(BaseCommand):
+    help = (
+        'Параллельно оформляет заказы из нескольких процессов на временной копии '
+        'базы SQLite и считает ошибки "database is locked". По умолчанию '
+        'включает настройки SQLITE_TUNING, с --plain сравнивает с исходными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count() * 2 + 1,
+                            help='Процессов, как в gunicorn.conf.py')
+        parser.add_argument('--orders', type=int, default=30, help='Заказов на процесс')
+        parser.add_argument('--plain', action='store_true', help='Без WAL, busy_timeout и BEGIN IMMEDIATE')
+        parser.add_argument('--host', default='localhost', help='Заголовок Host для запросов')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда проверяет только SQLite')
+        product_ids = list(
+            Product.objects.filter(available=True).order_by('id').values_list('id', flat=True)[:50]
+        )
+        if not product_ids:
+            raise CommandError('Нет доступных товаров: сначала заполните базу (manage.py populate_db)')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stress.sqlite3')
+            self.copy_database(path)
+            tasks = [(worker, options['orders'], product_ids, options['host'])
+                     for worker in range(options['workers'])]
+
+            started = time.monotonic()
+            with multiprocessing.Pool(
+                options['workers'], initializer=_init_worker, initargs=(path, not options['plain'])
+            ) as pool:
+                outcomes = pool.map(_checkout_worker, tasks)
+            elapsed = time.monotonic() - started
+
+        results = sum((result for result, _ in outcomes), Counter())
+        latencies = sorted(ms for _, worker_latencies in outcomes for ms in worker_latencies)
+        self.stdout.write(f'Режим: {"исходный" if options["plain"] else "SQLITE_TUNING"}, '
+                          f'процессов: {options["workers"]}, время: {elapsed:.1f} с')
+        for outcome, count in sorted(results.items()):
+            self.stdout.write(f'  {outcome}: {count}')
+        if latencies:
+            self.stdout.write(f'  p50: {latencies[len(latencies) // 2]:.1f} мс, '
+                              f'max: {latencies[-1]:.1f} мс, '
+                              f'заказов в секунду: {results["ok"] / elapsed:.1f}')
+
+        failed = sum(count for outcome, count in results.items() if outcome != 'ok')
+        if failed:
+            raise CommandError(f'Неуспешных оформлений: {failed}')
+        self.stdout.write(self.style.SUCCESS('Все заказы оформлены'))
+
+    def copy_database(self, path):
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            connection.connection.backup(target)
+            # Остатки не должны заканчиваться во время прогона
+            target.execute('UPDATE store_product SET stock = 1000000')
+            target.execute('PRAGMA journal_mode = DELETE')
+            target.commit()
+        finally:
+            target.close()
+        connections.close_all()
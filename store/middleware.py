@@ -0,0 +1,45 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from .cart import Cart, get_cart_storage
+
+
+class CartMiddleware:
+    """Добавляет request.cart и сохраняет корзину, только если она изменилась"""
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        storage = get_cart_storage(request)
+        loaded = []
+
+        def load_cart():
+            cart = Cart(storage.load(), max_lines=storage.max_lines)
+            loaded.append(cart)
+            return cart
+
+        request.cart = SimpleLazyObject(load_cart)
+        response = self.get_response(request)
+
+        if loaded and loaded[0].modified:
+            storage.save(dict(loaded[0].items()), response)
+        return response
+
+    async def __acall__(self, request):
+        # Лениво загрузить корзину в асинхронном коде нельзя - загружаем сразу
+        storage = get_cart_storage(request)
+        request.cart = cart = Cart(await storage.aload(), max_lines=storage.max_lines)
+        response = await self.get_response(request)
+
+        if cart.modified:
+            await storage.asave(dict(cart.items()), response)
+        return response
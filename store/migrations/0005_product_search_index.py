@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Размер пачки при заполнении индекса существующими товарами
+BATCH_SIZE = 5000
+
+
+def create_search_index(apps, schema_editor):
+    from store.search import get_backend
+
+    backend = get_backend(schema_editor.connection)
+    backend.create()
+    Product = apps.get_model('store', 'Product')
+    rows = Product.objects.using(schema_editor.connection.alias).order_by('id').values_list(
+        'id', 'name', 'description'
+    )
+    last_id = 0
+    while batch := list(rows.filter(id__gt=last_id)[:BATCH_SIZE]):
+        backend.index(batch)
+        last_id = batch[-1][0]
+
+
+def drop_search_index(apps, schema_editor):
+    from store.search import get_backend
+
+    get_backend(schema_editor.connection).drop()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
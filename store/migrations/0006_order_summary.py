@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:16
+
+from django.db import migrations, models
+from django.db.models import Min, Sum
+
+# Заказов в одной пачке при заполнении сводки
+BATCH_SIZE = 2000
+
+
+def fill_order_summary(apps, schema_editor):
+    from store.images import thumbnail_name
+
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    using = schema_editor.connection.alias
+    orders = Order.objects.using(using).order_by('id').only('id')
+    last_id = 0
+    while batch := list(orders.filter(id__gt=last_id)[:BATCH_SIZE]):
+        last_id = batch[-1].id
+        items = OrderItem.objects.using(using).filter(order__in=batch).values('order_id').order_by()
+        counts = dict(items.annotate(count=Sum('quantity')).values_list('order_id', 'count'))
+        first_ids = items.annotate(first=Min('id')).values_list('first', flat=True)
+        first_items = {
+            item.order_id: item
+            for item in OrderItem.objects.using(using).filter(id__in=list(first_ids)).select_related('product')
+        }
+        for order in batch:
+            order.items_count = counts.get(order.id, 0)
+            item = first_items.get(order.id)
+            if item is not None:
+                order.first_item_name = item.product.name
+                order.first_item_image = thumbnail_name(item.product)
+        Order.objects.using(using).bulk_update(batch, ['items_count', 'first_item_name', 'first_item_image'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='first_item_image',
+            field=models.ImageField(blank=True, editable=False, max_length=255, upload_to='', verbose_name='Изображение первого товара'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='first_item_name',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='Первый товар'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество товаров'),
+        ),
+        migrations.RunPython(fill_order_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_order_created_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created'], name='store_product_created_idx'),
+        ),
+    ]
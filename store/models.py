@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from .images import generate_variants, thumbnail_name, variants_are_current
+
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name="Название")
     slug = models.SlugField(unique=True, verbose_name="URL")
@@ -14,6 +16,17 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class ProductQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Только поля, нужные карточкам каталога и корзине, с категорией"""
+        return self.select_related('category').only(
+            'id', 'name', 'slug', 'description', 'price', 'image', 'image_variants', 'stock',
+            'available', 'updated', 'category__name', 'category__slug'
+        )
+
+    def for_detail(self):
+        return self.select_related('category')
+
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name="Категория")
     name = models.CharField(max_length=200, verbose_name="Название")
@@ -21,18 +34,52 @@ class Product(models.Model):
     description = models.TextField(blank=True, verbose_name="Описание")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
     image = models.ImageField(upload_to='products/', default='test.png', verbose_name="Изображение")
+    # Уменьшенные копии изображения, см. store/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Варианты изображения")
     stock = models.PositiveIntegerField(default=0, verbose_name="Остаток")
     available = models.BooleanField(default=True, verbose_name="Доступен")
     created = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
         ordering = ['name']
+        indexes = [
+            # Каталог показывает только доступные товары, упорядоченные по (name, id)
+            models.Index(fields=['name', 'id'], condition=models.Q(available=True),
+                         name='store_product_avail_name_idx'),
+            models.Index(fields=['category', 'name', 'id'], condition=models.Q(available=True),
+                         name='store_product_avail_cat_idx'),
+            # Список товаров в админке: все товары, упорядоченные по (name, id)
+            models.Index(fields=['name', 'id'], name='store_product_name_idx'),
+            # Фильтр админки по месяцу создания
+            models.Index(fields=['created'], name='store_product_created_idx'),
+        ]
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'image' not in update_fields or 'image' in self.get_deferred_fields():
+            return
+        if self.image and not variants_are_current(self):
+            variants = generate_variants(self.image.name, self.image.storage)
+            if variants is not None:
+                self.image_variants = variants
+                # updated входит в ключ кэша карточки товара
+                super().save(update_fields=['image_variants', 'updated'])
+
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        """Позиции заказа вместе с товарами и их категориями"""
+        return self.prefetch_related(
+            models.Prefetch('items', queryset=OrderItem.objects.select_related('product__category'))
+        )
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -57,16 +104,45 @@ class Order(models.Model):
     created = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     
+    # Сводка по позициям для списка заказов в профиле, заполняется при оформлении
+    items_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество товаров")
+    first_item_name = models.CharField(max_length=200, blank=True, editable=False, verbose_name="Первый товар")
+    first_item_image = models.ImageField(max_length=255, blank=True, editable=False, verbose_name="Изображение первого товара")
+    
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ['-created']
+        indexes = [
+            # Заказы пользователя в профиле
+            models.Index(fields=['user', '-created'], name='store_order_user_created_idx'),
+            # Фильтры админки по статусу и дате
+            models.Index(fields=['status', 'created'], name='store_order_status_created_idx'),
+            # Выгрузка и фильтры по диапазону дат без статуса
+            models.Index(fields=['created'], name='store_order_created_idx'),
+        ]
     
     def __str__(self):
         if self.user:
             return f"Заказ #{self.id} - {self.user.username}"
         else:
             return f"Заказ #{self.id} - {self.customer_name}"
+    
+    def set_summary(self, lines):
+        """Заполняет сводку по позициям: lines - пары (товар, количество) в порядке корзины"""
+        lines = list(lines)
+        self.items_count = sum(quantity for _, quantity in lines)
+        first = lines[0][0] if lines else None
+        self.first_item_name = first.name if first else ''
+        self.first_item_image = thumbnail_name(first) if first else ''
+    
+    def refresh_summary(self):
+        """Пересчитывает сводку по позициям из базы"""
+        items = self.items.select_related('product').order_by('id')
+        self.set_summary((item.product, item.quantity) for item in items)
+        self.save(update_fields=['items_count', 'first_item_name', 'first_item_image'])
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', verbose_name="Заказ")
@@ -0,0 +1,217 @@
+import base64
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .caching import PAGE_CACHE
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder обрезает время до миллисекунд, а курсор должен быть точным
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    data = json.dumps(values, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def get_page_size(request):
+    """Размер страницы из ?per_page=, ограниченный STORE_MAX_PAGE_SIZE"""
+    try:
+        per_page = int(request.GET.get('per_page', settings.STORE_PAGE_SIZE))
+    except ValueError:
+        per_page = settings.STORE_PAGE_SIZE
+    return max(1, min(per_page, settings.STORE_MAX_PAGE_SIZE))
+
+
+def _count_key(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    return f'store:count:{hashlib.md5(f"{sql}{params}".encode()).hexdigest()}'
+
+
+def cached_count(queryset, timeout=None):
+    """COUNT(*) для queryset, закэшированный по тексту SQL"""
+    key = _count_key(queryset)
+    count = caches[PAGE_CACHE].get(key)
+    if count is None:
+        count = queryset.order_by().count()
+        if timeout is None:
+            timeout = settings.STORE_COUNT_CACHE_TIMEOUT
+        caches[PAGE_CACHE].set(key, count, timeout)
+    return count
+
+
+async def acached_count(queryset, timeout=None):
+    key = _count_key(queryset)
+    count = await caches[PAGE_CACHE].aget(key)
+    if count is None:
+        count = await queryset.order_by().acount()
+        if timeout is None:
+            timeout = settings.STORE_COUNT_CACHE_TIMEOUT
+        await caches[PAGE_CACHE].aset(key, count, timeout)
+    return count
+
+
+def estimated_count(queryset):
+    """Оценка числа строк планировщиком PostgreSQL; для других баз - None"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.get_compiler(queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для списков админки на больших таблицах.
+
+    Точный COUNT(*) на каждой загрузке заменяется оценкой планировщика
+    (PostgreSQL) или количеством, закэшированным на STORE_COUNT_CACHE_TIMEOUT.
+    Списки меньше STORE_EXACT_COUNT_LIMIT строк считаются точно, поэтому на
+    последних страницах больших списков число может немного расходиться.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.STORE_EXACT_COUNT_LIMIT
+        estimate = estimated_count(queryset)
+        if estimate is not None:
+            return int(estimate) if estimate >= limit else queryset.count()
+
+        key = _count_key(queryset)
+        count = caches[PAGE_CACHE].get(key)
+        if count is None:
+            count = queryset.order_by().count()
+            # Небольшие списки не кэшируем: новый заказ сразу виден в количестве
+            if count >= limit:
+                caches[PAGE_CACHE].set(key, count, settings.STORE_COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Пагинация по курсору вместо OFFSET.
+
+    ordering - уникальный набор полей, например ('name', 'id') или
+    ('-created', '-id'). Глубокие страницы стоят столько же, сколько первая.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        opts = queryset.model._meta
+        self._model_fields = [opts.get_field(name) for name in self.fields]
+
+    def _values(self, obj):
+        return [getattr(obj, field.attname) for field in self._model_fields]
+
+    def _parse(self, cursor):
+        values = decode_cursor(cursor)
+        if len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        try:
+            return [field.to_python(value) for field, value in zip(self._model_fields, values)]
+        except Exception:
+            raise InvalidCursor(cursor)
+
+    def _seek(self, values, forward):
+        # (a, b) > (x, y)  =>  a > x OR (a = x AND b > y)
+        condition = Q()
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            step = Q(**{f'{self.fields[i]}__{lookup}': values[i]})
+            for field, value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{field: value})
+            condition |= step
+        return condition
+
+    def _window(self, after, before):
+        forward = before is None
+        queryset = self.queryset
+        if forward:
+            ordering = self.ordering
+            if after:
+                queryset = queryset.filter(self._seek(self._parse(after), forward=True))
+        else:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+            queryset = queryset.filter(self._seek(self._parse(before), forward=False))
+        return queryset.order_by(*ordering)[:self.per_page + 1]
+
+    def _build_page(self, objects, after, before):
+        forward = before is None
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if not forward:
+            objects.reverse()
+
+        next_cursor = previous_cursor = None
+        if objects:
+            if has_more or not forward:
+                next_cursor = encode_cursor(self._values(objects[-1]))
+            if (has_more and not forward) or (forward and after):
+                previous_cursor = encode_cursor(self._values(objects[0]))
+        return KeysetPage(objects, next_cursor, previous_cursor)
+
+    def page(self, after=None, before=None):
+        """Страница после курсора after или перед курсором before"""
+        objects = list(self._window(after, before))
+        return self._build_page(objects, after, before)
+
+    async def apage(self, after=None, before=None):
+        objects = [obj async for obj in self._window(after, before)]
+        return self._build_page(objects, after, before)
@@ -0,0 +1,286 @@
+"""
+Полнотекстовый поиск по товарам.
+
+Индекс хранится в отдельной таблице той же базы и обновляется сигналами
+(store/signals.py) и пачками при массовой загрузке:
+- SQLite: виртуальная таблица FTS5 store_product_fts (rowid = id товара);
+- PostgreSQL: таблица store_product_search с tsvector и GIN-индексом.
+
+В индекс кроме названия и описания попадает транслитерация названия, поэтому
+«noutbuk» находит «Ноутбук». Русские слова запроса укорачиваются до основы
+(на PostgreSQL - словарем russian, на SQLite - отбрасыванием окончаний) и
+ищутся по префиксу.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, router
+
+from .models import Product
+from .utils import transliterate
+
+MAX_TERMS = 8
+# Окончания, отбрасываемые у русских слов запроса (длинные раньше коротких)
+RUSSIAN_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией',
+    'ий', 'ый', 'ой', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ых', 'их', 'ую', 'юю',
+    'ов', 'ев', 'ей', 'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ию', 'ия',
+    'а', 'я', 'ы', 'и', 'у', 'ю', 'о', 'е', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM = 3
+_CYRILLIC = re.compile('[а-яё]')
+
+
+def stem(word):
+    """Грубая основа русского слова: без окончания, не короче MIN_STEM букв"""
+    if not _CYRILLIC.search(word):
+        return word
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def query_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Общий интерфейс индекса; SQL зависит от СУБД"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        raise NotImplementedError
+
+    def drop(self):
+        raise NotImplementedError
+
+    def index(self, rows):
+        """rows - кортежи (id, name, description)"""
+        raise NotImplementedError
+
+    def remove(self, ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def optimize(self):
+        pass
+
+    def search(self, terms, limit, offset):
+        """id доступных товаров по убыванию релевантности"""
+        raise NotImplementedError
+
+    def count(self, terms, limit):
+        """Число найденных товаров, но не больше limit"""
+        raise NotImplementedError
+
+    def _fetch(self, sql, params):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class SqliteSearchBackend(SearchBackend):
+    table = 'store_product_fts'
+    # Вес столбцов для bm25: название, описание, транслитерация
+    weights = (10.0, 1.0, 5.0)
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+                'name, description, translit, tokenize="unicode61 remove_diacritics 2")'
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def index(self, rows):
+        rows = [(pk, name, description, transliterate(name)) for pk, name, description in rows]
+        if not rows:
+            return
+        self.remove([row[0] for row in rows])
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, description, translit) VALUES (%s, %s, %s, %s)', rows
+            )
+
+    def remove(self, ids):
+        ids = list(ids)
+        with self.connection.cursor() as cursor:
+            # Не больше 900 параметров в одном запросе для старых SQLite
+            for start in range(0, len(ids), 900):
+                chunk = ids[start:start + 900]
+                cursor.execute(
+                    f'DELETE FROM {self.table} WHERE rowid IN ({", ".join(["%s"] * len(chunk))})', chunk
+                )
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def optimize(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+    def match(self, terms):
+        return ' AND '.join(f'"{stem(term)}"*' for term in terms)
+
+    def search(self, terms, limit, offset):
+        rows = self._fetch(
+            f'SELECT p.id FROM {self.table} f JOIN store_product p ON p.id = f.rowid '
+            f'WHERE {self.table} MATCH %s AND p.available '
+            f'ORDER BY bm25({self.table}, %s, %s, %s), p.id LIMIT %s OFFSET %s',
+            [self.match(terms), *self.weights, limit, offset],
+        )
+        return [pk for pk, in rows]
+
+    def count(self, terms, limit):
+        return self._fetch(
+            f'SELECT COUNT(*) FROM (SELECT 1 FROM {self.table} f JOIN store_product p ON p.id = f.rowid '
+            f'WHERE {self.table} MATCH %s AND p.available LIMIT %s)',
+            [self.match(terms), limit],
+        )[0][0]
+
+
+class PostgresSearchBackend(SearchBackend):
+    table = 'store_product_search'
+    document = (
+        "setweight(to_tsvector('russian', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'B') || "
+        "setweight(to_tsvector('russian', %s), 'C')"
+    )
+    # Префиксный запрос и по словарю russian (основы), и по simple (транслитерация)
+    tsquery = "(to_tsquery('russian', %s) || to_tsquery('simple', %s))"
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                'product_id bigint PRIMARY KEY REFERENCES store_product (id) '
+                'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                'document tsvector NOT NULL)'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.table}_document ON {self.table} USING gin (document)'
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def index(self, rows):
+        rows = [(pk, name, transliterate(name), description) for pk, name, description in rows]
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (product_id, document) VALUES (%s, {self.document}) '
+                'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove(self, ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE product_id = ANY(%s)', [list(ids)])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+
+    def optimize(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {self.table}')
+
+    def tsquery_text(self, terms):
+        # В to_tsquery допустимы только слова: query_terms уже убрал операторы
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def search(self, terms, limit, offset):
+        text = self.tsquery_text(terms)
+        rows = self._fetch(
+            f'SELECT p.id FROM {self.table} s JOIN store_product p ON p.id = s.product_id, '
+            f'(SELECT {self.tsquery} AS q) query WHERE s.document @@ query.q AND p.available '
+            'ORDER BY ts_rank_cd(s.document, query.q) DESC, p.id LIMIT %s OFFSET %s',
+            [text, text, limit, offset],
+        )
+        return [pk for pk, in rows]
+
+    def count(self, terms, limit):
+        text = self.tsquery_text(terms)
+        return self._fetch(
+            f'SELECT COUNT(*) FROM (SELECT 1 FROM {self.table} s JOIN store_product p ON p.id = s.product_id '
+            f'WHERE s.document @@ {self.tsquery} AND p.available LIMIT %s) found',
+            [text, text, limit],
+        )[0][0]
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection):
+    try:
+        return BACKENDS[connection.vendor](connection)
+    except KeyError:
+        raise NotImplementedError(f'Поиск не поддерживается для {connection.vendor}')
+
+
+def index_products(products, using=None):
+    """Добавляет или обновляет товары в индексе"""
+    using = using or router.db_for_write(Product)
+    get_backend(connections[using]).index(
+        (product.pk, product.name, product.description) for product in products
+    )
+
+
+def reindex_products(ids, using=None):
+    """Перечитывает название и описание товаров ids из базы и обновляет индекс"""
+    using = using or router.db_for_write(Product)
+    ids = list(ids)
+    backend = get_backend(connections[using])
+    # Не больше 900 параметров в одном запросе для старых SQLite
+    for start in range(0, len(ids), 900):
+        backend.index(
+            Product.objects.using(using).filter(id__in=ids[start:start + 900])
+            .values_list('id', 'name', 'description')
+        )
+
+
+def remove_products(ids, using=None):
+    using = using or router.db_for_write(Product)
+    get_backend(connections[using]).remove(ids)
+
+
+class SearchResults:
+    """Результаты поиска для django.core.paginator.Paginator.
+
+    Срезы выполняют запрос к индексу и возвращают товары для карточек каталога
+    в порядке релевантности.
+    """
+
+    def __init__(self, query, using=None):
+        self.terms = query_terms(query)
+        self.using = using or router.db_for_read(Product)
+        self.backend = get_backend(connections[self.using])
+
+    def count(self):
+        if not self.terms:
+            return 0
+        # Подсчет всех совпадений для частого слова дороже самой страницы
+        return self.backend.count(self.terms, settings.STORE_SEARCH_MAX_RESULTS)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError('SearchResults поддерживает только срезы')
+        if not self.terms:
+            return []
+        offset = item.start or 0
+        ids = self.backend.search(self.terms, item.stop - offset, offset)
+        products = Product.objects.using(self.using).for_listing().in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import invalidate_categories, invalidate_products
+from .models import Category, Product
+from .search import index_products, remove_products
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, using, **kwargs):
+    # Версии меняются после коммита: иначе запрос между сменой версии и коммитом
+    # закэшировал бы старые данные под новой версией
+    transaction.on_commit(invalidate_categories, using=using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, using, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: invalidate_products([pk]), using=using)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, using, update_fields=None, **kwargs):
+    # Сохранения без названия и описания (остаток, варианты изображения) индекс не меняют
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    index_products([instance], using=using)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, using, **kwargs):
+    remove_products([instance.pk], using=using)
@@ -1,4 +1,7 @@
 from django import template
+from django.utils.html import format_html, format_html_join
+
+from store.images import CONTENT_TYPES, srcset, variant_name, variants_are_current
 
 register = template.Library()
 
@@ -8,4 +11,34 @@ def multiply(value, arg):
     try:
         return float(value) * float(arg)
     except (ValueError, TypeError):
-        return 0 
\ No newline at end of file
+        return 0
+
+
+@register.simple_tag
+def product_image(product, sizes='100vw', css_class='', style='', eager=False):
+    """<picture> с вариантами изображения товара в srcset.
+
+    Пока варианты не созданы, выводит обычный <img> с оригиналом.
+    """
+    loading = 'eager' if eager else 'lazy'
+    if not variants_are_current(product):
+        return format_html(
+            '<img src="{}" class="{}" style="{}" alt="{}" loading="{}">',
+            product.image.url, css_class, style, product.name, loading,
+        )
+
+    variants = product.image_variants
+    *modern, fallback = variants['formats']
+    # Для src берем вариант среднего размера
+    width = variants['widths'][len(variants['widths']) // 2]
+    height = round(variants['height'] * width / variants['width'])
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+        (CONTENT_TYPES[fmt], srcset(product, fmt), sizes) for fmt in modern
+    ))
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" '
+        'class="{}" style="{}" alt="{}" loading="{}" decoding="async"></picture>',
+        sources, product.image.storage.url(variant_name(variants['source'], width, fallback)),
+        srcset(product, fallback), sizes, width, height, css_class, style, product.name, loading,
+    )
+
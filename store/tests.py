@@ -1,3 +1,1277 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import json
+import os
+import tempfile
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, reverse
+from PIL import Image
+
+from .caching import CART_COUNT_HOLE, CSRF_HOLE, get_categories
+from .cart import Cart, CookieCartStorage, ahydrate_cart, decode_cart, encode_cart, hydrate_cart
+from .checkout import CheckoutError, OutOfStockError, place_order
+from accounts.models import CustomUser
+from shop import metrics
+from shop.database import apply_sqlite_pragmas, database_from_env, sqlite_pragmas_from_env
+from shop.routers import PRIMARY_COOKIE
+
+from .images import variant_name
+from .models import Category, Order, OrderItem, Product
+from .pagination import EstimatedCountPaginator, KeysetPaginator
+
+
+def make_products(count, category=None, **kwargs):
+    if category is None:
+        category = Category.objects.create(name='Категория', slug='category')
+    return [
+        Product.objects.create(
+            category=category,
+            name=f'Товар {i}',
+            slug=f'product-{i}',
+            price=Decimal('10.00') + i,
+            stock=100,
+            **kwargs
+        )
+        for i in range(count)
+    ]
+
+
+def make_order(user, products, quantity=1):
+    order = Order.objects.create(user=user, address='Адрес', total_amount=0)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, price=product.price, quantity=quantity)
+        for product in products
+    ])
+    order.refresh_summary()
+    return order
+
+
+class QueryBudgetMixin:
+    """Проверяет, что страница укладывается в фиксированный бюджет запросов"""
+
+    def assertQueryBudget(self, url, budget, status_code=200):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status_code)
+        executed = len(ctx.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(query['sql'] for query in ctx.captured_queries)
+            self.fail(f'{url}: {executed} запросов при бюджете {budget}\n{queries}')
+        return response
+
+
+def cart_items(products, quantity=2):
+    return {product.id: quantity for product in products}
+
+
+def put_cart(client, items):
+    response = HttpResponse()
+    CookieCartStorage(None).save(items, response)
+    client.cookies.update(response.cookies)
+
+
+class HydrateCartTests(TestCase):
+    def test_empty_cart_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            cart = hydrate_cart({})
+        self.assertEqual(cart.queries, 0)
+        self.assertEqual(cart.total, 0)
+        self.assertFalse(cart)
+
+    def test_large_cart_is_loaded_in_one_query(self):
+        products = make_products(50)
+        with self.assertNumQueries(1):
+            cart = hydrate_cart(cart_items(products))
+            # Категория подгружается тем же запросом
+            [line.product.category.name for line in cart]
+        self.assertEqual(cart.queries, 1)
+        self.assertEqual(len(cart), 50)
+        self.assertEqual(cart.count, 100)
+        self.assertEqual(cart.total, sum(p.price * 2 for p in products))
+
+    def test_reported_queries_are_counted(self):
+        products = make_products(3)
+        queryset = Product.objects.for_listing().prefetch_related('orderitem_set')
+        with self.assertNumQueries(2):
+            cart = hydrate_cart(cart_items(products), queryset)
+        self.assertEqual(cart.queries, 2)
+
+    async def test_async_hydrate_counts_queries(self):
+        products = await sync_to_async(make_products)(3)
+        cart = await ahydrate_cart(cart_items(products))
+        self.assertEqual(cart.queries, 1)
+        self.assertEqual(len(cart), 3)
+
+    def test_missing_products_are_skipped(self):
+        products = make_products(2)
+        raw = cart_items(products)
+        products[0].delete()
+        cart = hydrate_cart(raw)
+        self.assertEqual([line.product for line in cart], [products[1]])
+
+
+class CartViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(30)
+        put_cart(self.client, cart_items(self.products))
+
+    def test_cart_detail_query_count_does_not_grow_with_cart(self):
+        # категории + товары корзины; корзина читается из cookie
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('store:cart_detail'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total'], sum(p.price * 2 for p in self.products))
+
+    def test_order_create_form_query_count_does_not_grow_with_cart(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('store:order_create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cart_items']), 30)
+
+
+    def test_deleted_product_is_dropped_from_cart(self):
+        self.products[1].delete()
+        response = self.client.get(reverse('store:cart_detail'))
+        self.assertEqual(len(response.context['cart_items']), 29)
+        # Корзина перезаписана без удаленного товара
+        self.assertIn('cart', response.cookies)
+        self.client.post(reverse('store:order_create'), {
+            'address': 'Адрес', 'customer_name': 'Гость', 'customer_email': 'g@example.com',
+            'customer_phone': '+79990000000',
+        })
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Order.objects.get().items.count(), 29)
+
+
+class PlaceOrderTests(TestCase):
+    def test_checkout_query_count_is_flat(self):
+        products = make_products(120)
+        # SAVEPOINT + блокировка товаров + заказ + позиции
+        # + 2 пачки UPDATE остатков + RELEASE SAVEPOINT
+        with self.assertNumQueries(7):
+            order = place_order(cart_items(products, quantity=3), address='Адрес')
+        self.assertEqual(order.total_amount, sum(p.price * 3 for p in products))
+        self.assertEqual(order.items.count(), 120)
+        self.assertFalse(Product.objects.exclude(stock=97).exists())
+
+    def test_total_amount_is_written_on_insert(self):
+        products = make_products(2)
+        order = place_order(cart_items(products), address='Адрес')
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('42.00'))
+
+    def test_order_summary_is_written_at_checkout(self):
+        products = make_products(3)
+        order = place_order(cart_items(products[::-1], quantity=2), address='Адрес')
+        order.refresh_from_db()
+        self.assertEqual(order.items_count, 6)
+        self.assertEqual(order.first_item_name, products[2].name)
+        self.assertEqual(order.first_item_image.name, products[2].image.name)
+
+    def test_out_of_stock_rolls_back(self):
+        products = make_products(2)
+        Product.objects.filter(id=products[1].id).update(stock=1)
+        with self.assertRaises(OutOfStockError) as ctx:
+            place_order(cart_items(products), address='Адрес')
+        self.assertEqual(ctx.exception.products, [products[1]])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(Product.objects.get(id=products[0].id).stock, 100)
+
+    def test_unavailable_product_is_rejected(self):
+        products = make_products(1, available=False)
+        with self.assertRaises(CheckoutError):
+            place_order(cart_items(products), address='Адрес')
+        self.assertFalse(Order.objects.exists())
+
+    def test_order_create_view_redirects_to_cart_when_out_of_stock(self):
+        products = make_products(1)
+        Product.objects.update(stock=0)
+        put_cart(self.client, cart_items(products))
+        response = self.client.post(reverse('store:order_create'), {
+            'address': 'Адрес',
+            'customer_name': 'Иван',
+            'customer_email': 'ivan@example.com',
+            'customer_phone': '+79991234567',
+        })
+        self.assertRedirects(response, reverse('store:cart_detail'))
+        self.assertFalse(Order.objects.exists())
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        self.products = make_products(7)
+        self.paginator = KeysetPaginator(Product.objects.all(), ordering=('name', 'id'), per_page=3)
+
+    def test_walks_forward_and_back(self):
+        first = self.paginator.page()
+        self.assertEqual(first.object_list, self.products[:3])
+        self.assertFalse(first.has_previous)
+
+        second = self.paginator.page(after=first.next_cursor)
+        self.assertEqual(second.object_list, self.products[3:6])
+
+        third = self.paginator.page(after=second.next_cursor)
+        self.assertEqual(third.object_list, self.products[6:])
+        self.assertFalse(third.has_next)
+
+        back = self.paginator.page(before=third.previous_cursor)
+        self.assertEqual(back.object_list, self.products[3:6])
+        self.assertTrue(back.has_previous)
+        self.assertEqual(self.paginator.page(before=back.previous_cursor).object_list, self.products[:3])
+
+    def test_descending_ordering(self):
+        paginator = KeysetPaginator(Product.objects.all(), ordering=('-name', '-id'), per_page=4)
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+        self.assertEqual(first.object_list + second.object_list, self.products[::-1])
+
+
+@override_settings(STORE_PAGE_SIZE=5, STORE_MAX_PAGE_SIZE=10)
+class ProductListPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = sorted(make_products(12), key=lambda p: (p.name, p.id))
+
+    def test_renders_one_page_with_total_count(self):
+        response = self.client.get(reverse('store:product_list'))
+        self.assertEqual(len(response.context['products']), 5)
+        self.assertEqual(response.context['total_count'], 12)
+        self.assertContains(response, '12 товаров')
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(reverse('store:product_list'), {'per_page': 1000})
+        self.assertEqual(len(response.context['products']), 10)
+
+    def test_next_page(self):
+        first = self.client.get(reverse('store:product_list')).context['page']
+        response = self.client.get(reverse('store:product_list'), {'after': first.next_cursor})
+        self.assertEqual(response.context['products'], self.products[5:10])
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('store:product_list'), {'after': '!!!'})
+        self.assertEqual(response.status_code, 404)
+
+
+class StorePagesQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        first = Category.objects.create(name='Первая', slug='first')
+        second = Category.objects.create(name='Вторая', slug='second')
+        self.products = make_products(10, category=first) + [
+            Product.objects.create(category=second, name=f'Другой {i}', slug=f'other-{i}', price=1, stock=1)
+            for i in range(10)
+        ]
+        self.admin = CustomUser.objects.create_superuser(
+            phone_number='+79990000000', username='admin', password='secret'
+        )
+        self.order = make_order(self.admin, self.products)
+
+    def test_product_list(self):
+        # категории + количество + страница товаров с категориями
+        self.assertQueryBudget(reverse('store:product_list'), 3)
+
+    def test_product_list_by_category(self):
+        self.assertQueryBudget(reverse('store:product_list_by_category', args=['second']), 4)
+
+    def test_product_detail(self):
+        product = self.products[0]
+        self.assertQueryBudget(reverse('store:product_detail', args=[product.id, product.slug]), 2)
+
+    def test_admin_product_changelist(self):
+        self.client.force_login(self.admin)
+        self.assertQueryBudget(reverse('admin:store_product_changelist'), 8)
+
+    def test_admin_order_change_page_does_not_grow_with_items(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:store_order_change', args=[self.order.id])
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        make_order(self.admin, self.products[:2])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=self.order, product=product, price=product.price, quantity=2)
+            for product in self.products
+        ])
+        # autocomplete-виджет выбирает один товар на строку, но не весь каталог
+        self.assertQueryBudget(url, len(small.captured_queries) + len(self.products))
+
+
+class CategoryNavigationCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Книги', slug='books')
+
+    def test_categories_are_cached_between_requests(self):
+        self.assertEqual(get_categories(), [self.category])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_categories(), [self.category])
+
+    def test_save_and_delete_invalidate_cache(self):
+        get_categories()
+        self.category.name = 'Журналы'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertEqual(get_categories()[0].name, 'Журналы')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertEqual(get_categories(), [])
+
+    def test_navigation_is_rendered_on_every_page(self):
+        self.client.get(reverse('store:cart_detail'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('store:cart_detail'))
+        self.assertContains(response, reverse('store:product_list_by_category', args=['books']))
+
+
+class CatalogPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(3)
+        self.url = reverse('store:product_list')
+
+    def test_anonymous_hit_skips_the_database(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, self.products[0].name)
+        self.assertNotContains(response, CSRF_HOLE)
+        self.assertNotContains(response, CART_COUNT_HOLE)
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+
+    def test_cart_count_is_personal(self):
+        self.client.get(self.url)
+        put_cart(self.client, cart_items(self.products[:2]))
+        response = self.client.get(self.url)
+        self.assertContains(response, '<span class="cart-count" id="cart-count">2</span>', html=True)
+
+    def test_product_save_evicts_list_and_detail(self):
+        product = self.products[0]
+        detail_url = reverse('store:product_detail', args=[product.id, product.slug])
+        self.client.get(self.url)
+        self.client.get(detail_url)
+        product.name = 'Новое имя'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            product.save()
+            # До коммита версия не меняется: страница, отрисованная сейчас,
+            # не попадет в кэш под новой версией
+            self.assertNotContains(self.client.get(self.url), 'Новое имя')
+        self.assertEqual(len(callbacks), 1)
+        self.assertContains(self.client.get(self.url), 'Новое имя')
+        self.assertContains(self.client.get(detail_url), 'Новое имя')
+
+    def test_other_products_keep_their_detail_cache(self):
+        other = self.products[1]
+        detail_url = reverse('store:product_detail', args=[other.id, other.slug])
+        self.client.get(detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+        with self.assertNumQueries(0):
+            self.client.get(detail_url)
+
+    def test_checkout_evicts_list_and_detail(self):
+        product = self.products[0]
+        product.stock = 3
+        product.save()
+        detail_url = reverse('store:product_detail', args=[product.id, product.slug])
+        self.assertContains(self.client.get(self.url), 'Осталось: 3')
+        self.assertContains(self.client.get(detail_url), '3 шт.')
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order({product.id: 3}, address='Адрес')
+        self.assertNotContains(self.client.get(self.url), 'Осталось: 3')
+        self.assertNotContains(self.client.get(detail_url), '3 шт.')
+
+    def test_category_change_evicts_pages(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Новая категория', slug='new')
+        self.assertContains(self.client.get(self.url), 'Новая категория')
+
+    def test_authenticated_users_are_not_cached(self):
+        user = CustomUser.objects.create_user(phone_number='+79991112233', username='u', password='p')
+        self.client.force_login(user)
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertIsNotNone(response.context)
+
+    def test_admin_list_editable_evicts_pages(self):
+        admin = CustomUser.objects.create_superuser(phone_number='+79990000000', username='admin', password='p')
+        self.client.get(self.url)
+        products = Product.objects.order_by('name', 'id')
+        data = {
+            'form-TOTAL_FORMS': len(products),
+            'form-INITIAL_FORMS': len(products),
+            '_save': 'Сохранить',
+        }
+        for i, product in enumerate(products):
+            data.update({
+                f'form-{i}-id': product.id,
+                f'form-{i}-price': '777.00' if i == 0 else product.price,
+                f'form-{i}-stock': product.stock,
+                f'form-{i}-available': 'on',
+            })
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(reverse('admin:store_product_changelist'), data)
+            self.client.logout()
+            # Сброс ждет коммита транзакции changelist_view
+            self.assertNotContains(self.client.get(self.url), '777')
+        self.assertEqual(len(callbacks), 1)
+        self.assertContains(self.client.get(self.url), '777')
+
+
+class CartStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(3)
+
+    def add(self, product, quantity=1):
+        return self.client.post(
+            reverse('store:add_to_cart'),
+            data={'product_id': product.id, 'quantity': quantity},
+            content_type='application/json'
+        )
+
+    def test_encoding_round_trip(self):
+        items = {12: 3, 45: 1}
+        self.assertEqual(encode_cart(items), '12:3,45:1')
+        self.assertEqual(decode_cart(encode_cart(items)), items)
+        self.assertEqual(decode_cart('1:2,bad,3:0'), {1: 2})
+
+    def test_cart_tracks_changes(self):
+        cart = Cart({1: 2})
+        cart.set(1, 2)
+        cart.remove(5)
+        self.assertFalse(cart.modified)
+        cart.add(1)
+        self.assertTrue(cart.modified)
+        self.assertEqual(dict(cart.items()), {1: 3})
+
+    def test_add_to_cart_does_not_write_to_database(self):
+        # только проверка товара, без сохранения сессии
+        with self.assertNumQueries(1):
+            response = self.add(self.products[0], 2)
+        self.assertEqual(response.json()['cart_count'], 2)
+        self.add(self.products[0])
+        self.add(self.products[1])
+        self.assertEqual(self.client.get(reverse('store:cart_detail')).context['total'],
+                         self.products[0].price * 3 + self.products[1].price)
+
+    def test_unchanged_cart_is_not_rewritten(self):
+        self.add(self.products[0])
+        response = self.client.get(reverse('store:cart_detail'))
+        self.assertNotIn('cart', response.cookies)
+
+    def test_remove_from_cart(self):
+        self.add(self.products[0])
+        self.client.get(reverse('store:remove_from_cart', args=[self.products[0].id]))
+        self.assertEqual(self.client.get(reverse('store:cart_detail')).context['cart_items'], [])
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.cookies['cart'] = f'{self.products[0].id}:5'
+        self.assertEqual(self.client.get(reverse('store:cart_detail')).context['cart_items'], [])
+
+    def test_full_cookie_cart_fits_browser_limit(self):
+        response = HttpResponse()
+        items = {10 ** 6 + i: 99 for i in range(settings.STORE_CART_COOKIE_MAX_LINES)}
+        CookieCartStorage(None).save(items, response)
+        self.assertLess(len(response.cookies['cart'].OutputString()), 4096)
+
+    @override_settings(STORE_CART_COOKIE_MAX_LINES=2)
+    def test_add_beyond_cookie_limit_is_rejected(self):
+        self.add(self.products[0])
+        self.add(self.products[1])
+        self.assertEqual(self.add(self.products[1]).status_code, 200)
+        response = self.add(self.products[2])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+        self.assertNotIn('cart', response.cookies)
+        self.assertEqual(len(self.client.get(reverse('store:cart_detail')).context['cart_items']), 2)
+
+    @override_settings(STORE_CART_STORAGE='store.cart.CacheCartStorage')
+    def test_cache_storage(self):
+        self.add(self.products[0], 4)
+        self.assertEqual(len(self.client.cookies['cart_id'].value), 32)
+        lines = self.client.get(reverse('store:cart_detail')).context['cart_items']
+        self.assertEqual([(line.product, line.quantity) for line in lines], [(self.products[0], 4)])
+
+    @override_settings(STORE_CART_STORAGE='store.cart.SessionCartStorage')
+    def test_session_storage_reads_legacy_format(self):
+        session = self.client.session
+        session['cart'] = {str(self.products[1].id): {'name': 'x', 'price': '1', 'quantity': 2}}
+        session.save()
+        self.add(self.products[0])
+        self.assertEqual(self.client.session['cart'], f'{self.products[1].id}:2,{self.products[0].id}:1')
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.products = make_products(30)
+        self.url = reverse('store:cart_batch')
+
+    def post(self, operations):
+        return self.client.post(self.url, data={'operations': operations}, content_type='application/json')
+
+    def test_reorder_in_one_round_trip(self):
+        operations = [{'product_id': p.id, 'quantity': 2} for p in self.products]
+        with self.assertNumQueries(1):
+            response = self.post(operations)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['cart_count'], 60)
+        self.assertEqual(Decimal(data['total']), sum(p.price * 2 for p in self.products))
+        self.assertEqual(len(self.client.get(reverse('store:cart_detail')).context['cart_items']), 30)
+
+    def test_set_and_remove(self):
+        first, second = self.products[:2]
+        put_cart(self.client, {first.id: 1, second.id: 5})
+        data = self.post([
+            {'product_id': first.id, 'quantity': 4, 'action': 'set'},
+            {'product_id': second.id, 'action': 'remove'},
+        ]).json()
+        self.assertEqual([(i['product_id'], i['quantity']) for i in data['items']], [(first.id, 4)])
+
+    def test_invalid_product_rejects_whole_batch(self):
+        Product.objects.filter(id=self.products[1].id).update(available=False)
+        response = self.post([
+            {'product_id': self.products[0].id, 'quantity': 1},
+            {'product_id': self.products[1].id, 'quantity': 1},
+            {'product_id': 999999, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 2)
+        self.assertNotIn('cart', response.cookies)
+
+    @override_settings(STORE_CART_COOKIE_MAX_LINES=2)
+    def test_batch_beyond_cookie_limit_keeps_cart(self):
+        first, second, third = self.products[:3]
+        put_cart(self.client, {first.id: 1})
+        response = self.post([
+            {'product_id': first.id, 'action': 'remove'},
+            {'product_id': second.id, 'quantity': 1},
+            {'product_id': third.id, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 200)
+        response = self.post([{'product_id': first.id, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('cart', response.cookies)
+        lines = self.client.get(reverse('store:cart_detail')).context['cart_items']
+        self.assertEqual({line.product for line in lines}, {second, third})
+
+    def test_malformed_operations(self):
+        self.assertEqual(self.post([{'product_id': 'x'}]).status_code, 400)
+        self.assertEqual(self.post([{'product_id': 1, 'action': 'drop'}]).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.client.post(self.url, data='{', content_type='application/json').status_code, 400)
+
+
+def instrumented_settings(**kwargs):
+    templates = [dict(settings.TEMPLATES[0], BACKEND='shop.instrumentation.InstrumentedDjangoTemplates')]
+    return override_settings(
+        MIDDLEWARE=['shop.instrumentation.RequestMetricsMiddleware'] + settings.MIDDLEWARE,
+        TEMPLATES=templates,
+        **kwargs
+    )
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(3)
+
+    @instrumented_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('store:cart_detail'))
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+
+    @instrumented_settings(REQUEST_METRICS_SAMPLE_RATE=1, REQUEST_METRICS_SLOW_MS=10_000)
+    def test_sampled_requests_are_logged_as_json(self):
+        with self.assertLogs('shop.requests', 'INFO') as logs:
+            self.client.get(reverse('store:product_list'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'store:product_list')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertNotIn('sql', record)
+
+    @instrumented_settings(REQUEST_METRICS_SAMPLE_RATE=0, REQUEST_METRICS_SLOW_MS=0)
+    def test_slow_requests_dump_sql_and_stack(self):
+        put_cart(self.client, cart_items(self.products))
+        with self.assertLogs('shop.requests', 'WARNING') as logs:
+            self.client.get(reverse('store:cart_detail'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(record['slow'])
+        self.assertEqual(len(record['sql']), record['queries'])
+        self.assertTrue(any('store/cart.py' in frame for q in record['sql'] for frame in q['stack']))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(2)
+
+    def scrape(self):
+        return self.client.get(reverse('metrics')).content.decode()
+
+    def test_exposition_format(self):
+        self.client.get(reverse('store:product_list'))
+        body = self.scrape()
+        self.assertIn('# TYPE shop_http_requests_total counter', body)
+        self.assertIn('shop_http_requests_total{view="store:product_list",method="GET",status="200"}', body)
+        self.assertIn('shop_http_request_duration_seconds_bucket{view="store:product_list",le="+Inf"}', body)
+        self.assertIn('shop_db_queries_per_request_count{view="store:product_list"}', body)
+
+    def test_checkout_metrics(self):
+        put_cart(self.client, cart_items(self.products, quantity=1))
+        before = metrics.collect().get(('shop_checkout_total', ('success',)), 0)
+        self.client.post(reverse('store:order_create'), {
+            'address': 'Адрес', 'customer_name': 'Иван',
+            'customer_email': 'ivan@example.com', 'customer_phone': '+79991234567',
+        })
+        self.assertEqual(metrics.collect()[('shop_checkout_total', ('success',))], before + 1)
+        self.assertIn('shop_order_value_total', self.scrape())
+
+    def test_values_are_merged_across_process_files(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            metrics.checkouts.inc(result='worker-test')
+            metrics.flush()
+            # Файл другого рабочего процесса
+            with open(os.path.join(metrics_dir, 'metrics_1.json'), 'w') as f:
+                json.dump([
+                    ['shop_checkout_total', ['worker-test'], 2],
+                    ['shop_checkout_cart_lines', [], [[0, 1, 1, 1, 1, 1, 1, 1], 2, 1]],
+                ], f)
+            values = metrics.collect()
+        self.assertEqual(values[('shop_checkout_total', ('worker-test',))],
+                         metrics._values[('shop_checkout_total', ('worker-test',))] + 2)
+        self.assertGreaterEqual(values[('shop_checkout_cart_lines', ())][2], 1)
+
+    def test_dead_process_files_are_folded(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            for pid in (1, 2):
+                with open(os.path.join(metrics_dir, f'metrics_{pid}.json'), 'w') as f:
+                    json.dump([
+                        ['shop_checkout_total', ['worker-test'], pid],
+                        ['shop_checkout_cart_lines', [], [[0, 1, 1, 1, 1, 1, 1, 1], 2, 1]],
+                    ], f)
+            before = metrics.collect()
+            metrics.merge_dead_process(metrics_dir, 1)
+            metrics.merge_dead_process(metrics_dir, 2)
+            self.assertEqual(
+                sorted(os.listdir(metrics_dir)),
+                sorted([metrics.DEAD_PROCESSES_FILE, f'metrics_{os.getpid()}.json']),
+            )
+            self.assertEqual(metrics.collect(), before)
+
+
+class DatabaseFromEnvTests(TestCase):
+    def test_sqlite_by_default(self):
+        with mock.patch.dict(os.environ, {'SQLITE_PATH': '/tmp/shop.sqlite3'}):
+            os.environ.pop('DB_ENGINE', None)
+            database = database_from_env('db.sqlite3')
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['NAME'], '/tmp/shop.sqlite3')
+
+    def test_postgresql_with_persistent_connections(self):
+        with mock.patch.dict(os.environ, {'DB_ENGINE': 'postgresql', 'DB_CONN_MAX_AGE': '120'}):
+            database = database_from_env('db.sqlite3')
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['CONN_MAX_AGE'], 120)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', database['OPTIONS'])
+
+    def test_pool_disables_persistent_connections(self):
+        with mock.patch.dict(os.environ, {'DB_ENGINE': 'postgresql', 'DB_POOL': '1', 'DB_POOL_MAX_SIZE': '20'}):
+            database = database_from_env('db.sqlite3')
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 20)
+
+
+class SqliteTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_on_connection(self):
+        previous = {name: self.pragma(name) for name in ('busy_timeout', 'cache_size')}
+        try:
+            with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': -4096}):
+                apply_sqlite_pragmas(sender=None, connection=connection)
+            self.assertEqual(self.pragma('busy_timeout'), 1234)
+            self.assertEqual(self.pragma('cache_size'), -4096)
+        finally:
+            with override_settings(SQLITE_PRAGMAS=previous):
+                apply_sqlite_pragmas(sender=None, connection=connection)
+
+    def test_tuning_uses_immediate_transactions(self):
+        with mock.patch.dict(os.environ, {'SQLITE_TUNING': '1'}):
+            os.environ.pop('DB_ENGINE', None)
+            database = database_from_env('db.sqlite3')
+            pragmas = sqlite_pragmas_from_env()
+        self.assertEqual(database['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(pragmas['journal_mode'], 'WAL')
+
+
+
+class CopyDatabaseTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def test_copy_keeps_rows_and_resets_sequences(self):
+        user = CustomUser.objects.create_user(phone_number='+79990000001', username='buyer', password='p')
+        products = make_products(3)
+        make_order(user, products)
+        # Источник - файл SQLite со снимком тестовой базы default
+        source = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'source.sqlite3')
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM INTO %s', [source])
+
+        call_command('copy_database', source=source, database='replica', batch_size=2, stdout=StringIO())
+
+        for model in (CustomUser, Category, Product, Order, OrderItem):
+            self.assertEqual(model.objects.using('replica').count(), model.objects.count(), model)
+        self.assertEqual(
+            list(Product.objects.using('replica').order_by('id').values_list('id', 'name', 'created')),
+            list(Product.objects.order_by('id').values_list('id', 'name', 'created')),
+        )
+        # После сброса последовательностей новые строки не конфликтуют с перенесенными
+        product = Product.objects.using('replica').create(
+            category_id=products[0].category_id, name='Новый', slug='new', price=1
+        )
+        self.assertGreater(product.pk, products[-1].pk)
+        order = Order.objects.using('replica').create(address='Адрес', total_amount=0)
+        self.assertGreater(order.pk, Order.objects.get().pk)
+
+
+class PopulateDbTests(TestCase):
+    def test_small_dataset(self):
+        out = StringIO()
+        call_command('populate_db', categories=2, products=10, users=3, orders=5, batch_size=4, stdout=out)
+        self.assertEqual(Category.objects.count(), 2)
+        self.assertEqual(Product.objects.count(), 10)
+        self.assertEqual(CustomUser.objects.count(), 3)
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertTrue(OrderItem.objects.exists())
+        self.assertFalse(Order.objects.filter(items__isnull=True).exists())
+        self.assertIn('Заказы: 5/5', out.getvalue())
+
+
+class StressCheckoutTests(TransactionTestCase):
+    def test_parallel_checkouts_do_not_fail(self):
+        # Команда копирует базу во временный файл, поэтому данные должны быть зафиксированы
+        make_products(5)
+        out = StringIO()
+        call_command('stress_checkout', workers=4, orders=5, host='testserver', stdout=out)
+        self.assertIn('ok: 20', out.getvalue())
+
+
+class BenchJourneysTests(TestCase):
+    def test_journeys_run_and_clean_up(self):
+        products = make_products(3)
+        out = StringIO()
+        call_command('bench_journeys', iterations=1, warmup=0, host='testserver', stdout=out)
+        for step in ('browse', 'order_create', 'register', 'login', 'order_detail'):
+            self.assertIn(step, out.getvalue())
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(CustomUser.objects.exists())
+        self.assertEqual([p.stock for p in Product.objects.order_by('id')], [p.stock for p in products])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.product = make_products(1)[0]
+        # На «реплике» та же строка, но с отставшим названием
+        category = Category.objects.using('replica').create(
+            id=self.product.category_id, name='Категория', slug='category'
+        )
+        Product.objects.using('replica').create(
+            id=self.product.id, category=category, name='Старое название',
+            slug=self.product.slug, price=self.product.price, stock=100,
+        )
+        self.url = reverse('store:product_detail', args=[self.product.id, self.product.slug])
+
+    def test_catalog_reads_go_to_replica(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Старое название')
+
+    def test_write_pins_client_to_primary(self):
+        put_cart(self.client, cart_items([self.product], quantity=1))
+        response = self.client.post(reverse('store:order_create'), {
+            'address': 'Адрес', 'customer_name': 'Иван',
+            'customer_email': 'ivan@example.com', 'customer_phone': '+79991234567',
+        })
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        self.assertEqual(self.client.get(response['Location']).status_code, 200)
+        self.assertContains(self.client.get(self.url), self.product.name)
+
+    def test_cart_update_without_database_write_keeps_replica(self):
+        response = self.client.post(
+            reverse('store:add_to_cart'), {'product_id': self.product.id, 'quantity': 1},
+            content_type='application/json',
+        )
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_profile_reads_from_replica(self):
+        user = CustomUser.objects.create_user(username='buyer', phone_number='+79990000001', password='pass')
+        make_order(user, [self.product])
+        self.client.force_login(user)
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('store_order' in query['sql'] for query in replica_queries.captured_queries))
+
+
+def reload_store_urls():
+    # urlpatterns выбираются при импорте по STORE_ASYNC_VIEWS; корневой URLconf
+    # перезагружается, чтобы include() заново прочитал список
+    importlib.reload(import_module('store.urls'))
+    importlib.reload(import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Очистка выполняется после выхода из override_settings
+        cls.addClassCleanup(reload_store_urls)
+        cls.enterClassContext(override_settings(STORE_ASYNC_VIEWS=True))
+        reload_store_urls()
+
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(3)
+
+    async def test_catalog_pages(self):
+        response = await self.async_client.get(reverse('store:product_list'))
+        self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+        self.assertContains(response, self.products[0].name)
+
+        product = self.products[1]
+        response = await self.async_client.get(reverse('store:product_detail', args=[product.id, product.slug]))
+        self.assertContains(response, product.name)
+
+    @instrumented_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    async def test_queries_are_counted_on_async_path(self):
+        before = metrics.collect().get(('shop_db_queries_per_request', ('store:product_list',)))
+        response = await self.async_client.get(reverse('store:product_list'))
+        self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+        db = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))['db']
+        self.assertNotIn('desc="0 queries"', db)
+        self.assertGreater(float(db.split(';')[0].removeprefix('dur=')), 0)
+        counts, total, count = metrics.collect()[('shop_db_queries_per_request', ('store:product_list',))]
+        self.assertGreater(total - (before[1] if before else 0), 0)
+
+    async def test_add_to_cart_and_cart_detail(self):
+        response = await self.async_client.post(
+            reverse('store:add_to_cart'), {'product_id': self.products[0].id, 'quantity': 2},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['cart_count'], 2)
+        self.assertIn(CookieCartStorage.cookie_name, response.cookies)
+
+        response = await self.async_client.get(reverse('store:cart_detail'))
+        self.assertEqual(response.context['total'], self.products[0].price * 2)
+
+    async def test_cart_batch(self):
+        response = await self.async_client.post(reverse('store:cart_batch'), {'operations': [
+            {'product_id': product.id, 'quantity': 1} for product in self.products
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart_count'], 3)
+
+        response = await self.async_client.post(reverse('store:cart_batch'), {'operations': [
+            {'product_id': 0, 'quantity': 1}
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+def image_file(name='photo.png', size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGBA', size, (200, 50, 50, 255)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(STORE_IMAGE_WIDTHS=(160, 640, 2000))
+class ProductImageVariantsTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.category = Category.objects.create(name='Категория', slug='category')
+
+    def test_save_generates_variants(self):
+        product = make_products(1, self.category, image=image_file())[0]
+        variants = product.image_variants
+        self.assertEqual(variants['source'], product.image.name)
+        # Шире оригинала варианты не создаются
+        self.assertEqual(variants['widths'], [160, 640])
+        for width in variants['widths']:
+            for fmt in ('webp', 'jpeg'):
+                self.assertTrue(product.image.storage.exists(variant_name(product.image.name, width, fmt)))
+        self.assertEqual(Product.objects.get(pk=product.pk).image_variants, variants)
+
+    def test_template_tag_renders_picture(self):
+        product = make_products(1, self.category, image=image_file())[0]
+        response = self.client.get(reverse('store:product_detail', args=[product.id, product.slug]))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, '-160w.webp 160w, ')
+        self.assertContains(response, 'width="640" height="427"')
+
+    def test_template_tag_without_variants(self):
+        product = make_products(1, self.category)[0]
+        self.assertEqual(product.image_variants, {})
+        response = self.client.get(reverse('store:product_list'))
+        self.assertContains(response, f'src="{product.image.url}"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_command_backfills_bulk_created_products(self):
+        name = Product.image.field.storage.save('products/shared.png', image_file())
+        Product.objects.bulk_create([
+            Product(category=self.category, name=f'Товар {i}', slug=f'product-{i}', price=1, image=name)
+            for i in range(3)
+        ])
+        out = StringIO()
+        call_command('generate_image_variants', workers=1, batch_size=2, stdout=out)
+        self.assertIn('Изображений: 1, товаров обновлено: 3', out.getvalue())
+        self.assertEqual(
+            {product.image_variants['source'] for product in Product.objects.all()}, {name}
+        )
+
+        out = StringIO()
+        call_command('generate_image_variants', workers=1, stdout=out)
+        self.assertIn('актуальны', out.getvalue())
+
+
+class CompressedStaticStorageTests(TestCase):
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        with override_settings(
+            STATIC_ROOT=static_root.name,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'shop.storage.CompressedManifestStaticFilesStorage',
+            }},
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            hashed = staticfiles_storage.stored_name('store/css/shop.css')
+
+        self.assertRegex(hashed, r'^store/css/shop\.[0-9a-f]{12}\.css$')
+        path = os.path.join(static_root.name, hashed)
+        with open(path, 'rb') as f:
+            original = f.read()
+        with gzip.open(path + '.gz') as f:
+            self.assertEqual(f.read(), original)
+        with open(path + '.br', 'rb') as f:
+            self.assertEqual(brotli.decompress(f.read()), original)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Категория', slug='category')
+        self.laptop = Product.objects.create(
+            category=category, name='Умный ноутбук', slug='laptop', price=100, stock=5,
+            description='Легкий и быстрый',
+        )
+        self.kettle = Product.objects.create(
+            category=category, name='Электрический чайник', slug='kettle', price=10, stock=5,
+            description='Подходит к ноутбуку по цвету',
+        )
+
+    def search(self, query, **params):
+        return self.client.get(reverse('store:search'), {'q': query, **params})
+
+    def test_stemming_transliteration_and_ranking(self):
+        response = self.search('ноутбуки')
+        # Совпадение в названии важнее совпадения в описании
+        self.assertEqual(list(response.context['products']), [self.laptop, self.kettle])
+        self.assertEqual(list(self.search('noutbuk').context['products']), [self.laptop])
+        self.assertEqual(list(self.search('умные ноутбуки').context['products']), [self.laptop])
+        self.assertContains(self.search('Чайники'), 'Электрический чайник')
+
+    def test_index_follows_changes(self):
+        self.laptop.name = 'Планшет'
+        self.laptop.save()
+        self.assertEqual(list(self.search('планшет').context['products']), [self.laptop])
+        self.assertEqual(list(self.search('noutbuk').context['products']), [])
+
+        Product.objects.filter(pk=self.kettle.pk).update(available=False)
+        self.assertEqual(self.search('чайник').context['page'].paginator.count, 0)
+
+        self.laptop.delete()
+        self.assertEqual(self.search('планшет').context['page'].paginator.count, 0)
+
+    def test_pagination_and_empty_query(self):
+        response = self.search('ноутбук', per_page=1, page=2)
+        self.assertEqual(list(response.context['products']), [self.kettle])
+        self.assertEqual(response.context['page'].paginator.num_pages, 2)
+
+        response = self.search('  ')
+        self.assertEqual(list(response.context['products']), [])
+        self.assertContains(response, 'Введите запрос')
+
+    def test_rebuild_command_indexes_bulk_loaded_products(self):
+        Product.objects.bulk_create([
+            Product(category=self.laptop.category, name=f'Термос {i}', slug=f'thermos-{i}', price=1, stock=1)
+            for i in range(3)
+        ])
+        self.assertEqual(self.search('термос').context['page'].paginator.count, 0)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('термос').context['page'].paginator.count, 3)
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        products = make_products(2)
+        user = CustomUser.objects.create_user(username='buyer', phone_number='+79990000001', password='pass')
+        self.paid = make_order(user, products, quantity=2)
+        self.pending = make_order(user, products[:1])
+        Order.objects.filter(id=self.paid.id).update(status='paid', created='2025-03-10T12:00:00Z')
+        Order.objects.filter(id=self.pending.id).update(created='2025-03-12T12:00:00Z')
+
+    def export(self, **options):
+        out = StringIO()
+        call_command('export_orders', stdout=out, **options)
+        return out.getvalue()
+
+    def test_csv_with_filters(self):
+        rows = list(csv.DictReader(StringIO(self.export(statuses=['paid']))))
+        self.assertEqual([row['order_id'] for row in rows], [str(self.paid.id)] * 2)
+        self.assertEqual(rows[0]['username'], 'buyer')
+        self.assertEqual(rows[0]['line_total'], '20.00')
+
+        rows = list(csv.DictReader(StringIO(self.export(date_from='2025-03-11', date_to='2025-03-12'))))
+        self.assertEqual([row['order_id'] for row in rows], [str(self.pending.id)])
+        self.assertEqual(self.export(date_to='2025-03-09').count('\n'), 1)
+
+    def test_jsonl(self):
+        lines = self.export(format='jsonl', chunk_size=1).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['product_name'], 'Товар 0')
+
+    def test_admin_action_streams_selected_orders(self):
+        admin = CustomUser.objects.create_superuser(username='admin', phone_number='+79990000002', password='pass')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:store_order_changelist'), {
+            'action': 'export_csv', '_selected_action': [self.pending.id],
+        })
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 2)
+        self.assertIn(f'{self.pending.id},', content)
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Категория', slug='category')
+        self.existing = Product.objects.create(
+            category=self.category, name='Чайник', slug='kettle', price=10, stock=5,
+            description='Старое описание',
+        )
+
+    def write(self, content, suffix):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def import_file(self, content, suffix='.csv', **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_products', self.write(content, suffix), stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def search(self, query):
+        return self.client.get(reverse('store:search'), {'q': query}).context['page'].paginator.count
+
+    def test_csv_creates_and_updates_by_slug(self):
+        out, err = self.import_file(
+            'slug,name,category,price,stock,available\n'
+            'kettle,,,12.50,,нет\n'
+            'laptop,Ноутбук,category,100,3,да\n'
+            'bad,Без категории,missing,1,1,\n'
+            'tablet,Планшет,,5,1,\n',
+            batch_size=2,
+        )
+        self.assertIn('новых 1, обновлено 1, ошибок 2', out)
+        self.assertIn('Строка 4: Неизвестная категория: missing', err)
+        self.assertIn('Строка 5: Для нового товара нужны поля: category', err)
+
+        self.existing.refresh_from_db()
+        # Пустые ячейки не затирают имя и остаток
+        self.assertEqual((self.existing.name, self.existing.price, self.existing.stock, self.existing.available),
+                         ('Чайник', Decimal('12.50'), 5, False))
+        laptop = Product.objects.get(slug='laptop')
+        self.assertEqual((laptop.category, laptop.stock, laptop.available), (self.category, 3, True))
+        self.assertEqual(self.search('ноутбук'), 1)
+
+    def test_blank_description_keeps_existing(self):
+        out, _ = self.import_file(
+            'slug,name,category,price,description\n'
+            'kettle,Чайник 2,,,\n'
+            'cup,Кружка,category,2,\n'
+        )
+        self.assertIn('новых 1, обновлено 1, ошибок 0', out)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.description), ('Чайник 2', 'Старое описание'))
+        self.assertEqual(Product.objects.get(slug='cup').description, '')
+
+    def test_jsonl_and_dry_run(self):
+        content = (
+            '{"slug": "kettle", "name": "Электрический чайник", "available": true}\n'
+            'не json\n'
+            '{"slug": "cup", "name": "Кружка", "category": "category", "price": "2", "stock": "x"}\n'
+        )
+        out, err = self.import_file(content, '.jsonl', dry_run=True)
+        self.assertIn('ошибок 2', out)
+        self.assertIn('Строка 2: Не удалось разобрать строку', err)
+        self.assertIn('Строка 3: Остаток', err)
+        self.assertEqual(Product.objects.get(slug='kettle').name, 'Чайник')
+
+        self.import_file(content, '.jsonl')
+        self.assertEqual(Product.objects.get(slug='kettle').name, 'Электрический чайник')
+        self.assertEqual(self.search('электрический'), 1)
+
+    def test_admin_upload(self):
+        admin = CustomUser.objects.create_superuser(username='admin', phone_number='+79990000002', password='pass')
+        self.client.force_login(admin)
+        url = reverse('admin:store_product_import')
+        self.assertContains(self.client.get(reverse('admin:store_product_changelist')), url)
+        upload = SimpleUploadedFile('erp.csv', '\ufeffslug,stock\nkettle,42\n'.encode())
+        response = self.client.post(url, {'file': upload}, follow=True)
+        self.assertContains(response, 'обновлено 1, ошибок 0')
+        self.assertEqual(Product.objects.get(slug='kettle').stock, 42)
+
+        upload = SimpleUploadedFile('erp.txt', b'slug\n')
+        self.assertContains(self.client.post(url, {'file': upload}), 'Не удалось определить формат')
+
+
+class AdminBulkEditTests(TestCase):
+    def setUp(self):
+        admin = CustomUser.objects.create_superuser(username='admin', phone_number='+79990000002', password='pass')
+        self.client.force_login(admin)
+
+    def test_list_editable_saves_with_one_bulk_update(self):
+        products = make_products(3)
+        data = {
+            'form-TOTAL_FORMS': 3, 'form-INITIAL_FORMS': 3, '_save': 'Сохранить',
+        }
+        for i, product in enumerate(products):
+            data.update({
+                f'form-{i}-id': product.id, f'form-{i}-price': product.price,
+                f'form-{i}-stock': product.stock, f'form-{i}-available': 'on',
+            })
+        data['form-0-price'] = '99.00'
+        data['form-2-stock'] = '7'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('admin:store_product_changelist'), data)
+        self.assertEqual(response.status_code, 302)
+        updates = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE "store_product"')]
+        self.assertEqual(len(updates), 1)
+
+        products = [Product.objects.get(pk=product.pk) for product in products]
+        self.assertEqual(products[0].price, Decimal('99.00'))
+        self.assertEqual(products[2].stock, 7)
+        self.assertGreater(products[0].updated, products[1].updated)
+        self.assertEqual(
+            sorted(LogEntry.objects.values_list('object_id', flat=True)),
+            sorted([str(products[0].pk), str(products[2].pk)]),
+        )
+
+    def test_status_action_updates_in_batches(self):
+        user = CustomUser.objects.create_user(username='buyer', phone_number='+79990000001', password='pass')
+        products = make_products(1)
+        orders = [make_order(user, products) for _ in range(5)]
+        Order.objects.filter(pk=orders[0].pk).update(status='shipped')
+        with mock.patch('store.admin.BULK_BATCH_SIZE', 2):
+            response = self.client.post(reverse('admin:store_order_changelist'), {
+                'action': 'mark_as_shipped', 'select_across': 1, 'index': 0,
+                '_selected_action': [orders[0].pk],
+            }, follow=True)
+        self.assertContains(response, 'у заказов: 4')
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'shipped'})
+        entries = LogEntry.objects.filter(action_flag=CHANGE)
+        self.assertEqual(entries.count(), 4)
+        self.assertEqual(entries.first().get_change_message(), 'Changed Статус.')
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = CustomUser.objects.create_superuser(username='admin', phone_number='+79990000002', password='pass')
+        self.client.force_login(self.admin)
+
+    @override_settings(STORE_EXACT_COUNT_LIMIT=3)
+    def test_estimated_count_paginator(self):
+        make_products(3)
+        paginator = EstimatedCountPaginator(Product.objects.order_by('id'), 2)
+        self.assertEqual(paginator.count, 3)
+        Product.objects.create(category=Category.objects.get(), name='Новый', slug='new', price=1)
+        # Количество больших списков берется из кэша
+        self.assertEqual(EstimatedCountPaginator(Product.objects.order_by('id'), 2).count, 3)
+        # Маленькие списки считаются точно: новый товар виден сразу
+        self.assertEqual(EstimatedCountPaginator(Product.objects.filter(stock=0), 2).count, 1)
+
+        with mock.patch('store.pagination.estimated_count', return_value=5000.0):
+            self.assertEqual(EstimatedCountPaginator(Product.objects.all(), 2).count, 5000)
+        with mock.patch('store.pagination.estimated_count', return_value=2.0):
+            self.assertEqual(EstimatedCountPaginator(Product.objects.filter(stock=0), 2).count, 1)
+
+    def test_order_changelist_query_budget(self):
+        products = make_products(1)
+        users = [
+            CustomUser.objects.create_user(username=f'buyer{i}', phone_number=f'+7999000001{i}', password='pass')
+            for i in range(5)
+        ]
+        for user in users:
+            make_order(user, products)
+        url = reverse('admin:store_order_changelist')
+        # Первая загрузка запоминает годы для фильтра по месяцам
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertContains(response, 'buyer4')
+        # сессия + пользователь + количество + заказы с пользователями
+        self.assertEqual(len(ctx.captured_queries), 4)
+        self.assertFalse(any('DISTINCT' in query['sql'] for query in ctx.captured_queries))
+
+    def test_created_month_filter(self):
+        user = CustomUser.objects.create_user(username='buyer', phone_number='+79990000001', password='pass')
+        products = make_products(1)
+        march, april = make_order(user, products), make_order(user, products)
+        Order.objects.filter(pk=march.pk).update(created='2025-03-31T23:00:00Z')
+        Order.objects.filter(pk=april.pk).update(created='2025-04-01T00:00:00Z')
+        url = reverse('admin:store_order_changelist')
+
+        response = self.client.get(url, {'created_month': '2025'})
+        self.assertEqual(list(response.context['cl'].result_list), [april, march])
+        self.assertContains(response, 'Март 2025')
+        response = self.client.get(url, {'created_month': '2025-03'})
+        self.assertEqual(list(response.context['cl'].result_list), [march])
+        self.assertEqual(self.client.get(url, {'created_month': '2025-13'}).status_code, 302)
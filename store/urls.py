@@ -1,15 +1,21 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'store'
 
+# Набор представлений каталога и корзины выбирается настройкой STORE_ASYNC_VIEWS
+catalog = async_views if settings.STORE_ASYNC_VIEWS else views
+
 urlpatterns = [
-    path('', views.product_list, name='product_list'),
-    path('category/<slug:category_slug>/', views.product_list, name='product_list_by_category'),
-    path('<int:id>/<slug:slug>/', views.product_detail, name='product_detail'),
-    path('add-to-cart/', views.add_to_cart, name='add_to_cart'),
-    path('cart/', views.cart_detail, name='cart_detail'),
-    path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('', catalog.product_list, name='product_list'),
+    path('category/<slug:category_slug>/', catalog.product_list, name='product_list_by_category'),
+    path('search/', views.search, name='search'),
+    path('<int:id>/<slug:slug>/', catalog.product_detail, name='product_detail'),
+    path('add-to-cart/', catalog.add_to_cart, name='add_to_cart'),
+    path('cart/batch/', catalog.cart_batch, name='cart_batch'),
+    path('cart/', catalog.cart_detail, name='cart_detail'),
+    path('cart/remove/<int:product_id>/', catalog.remove_from_cart, name='remove_from_cart'),
     path('order/create/', views.order_create, name='order_create'),
     path('order/success/<int:order_id>/', views.order_success, name='order_success'),
-] 
\ No newline at end of file
+]
@@ -0,0 +1,53 @@
+import re
+from contextlib import contextmanager
+
+# Транслитерация кириллицы
+TRANSLIT_MAP = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ё': 'YO',
+    'Ж': 'ZH', 'З': 'Z', 'И': 'I', 'Й': 'Y', 'К': 'K', 'Л': 'L', 'М': 'M',
+    'Н': 'N', 'О': 'O', 'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U',
+    'Ф': 'F', 'Х': 'H', 'Ц': 'TS', 'Ч': 'CH', 'Ш': 'SH', 'Щ': 'SCH',
+    'Ъ': '', 'Ы': 'Y', 'Ь': '', 'Э': 'E', 'Ю': 'YU', 'Я': 'YA'
+}
+
+_TRANSLIT_TABLE = str.maketrans(TRANSLIT_MAP)
+
+
+def transliterate(text):
+    """Заменяет кириллицу латиницей"""
+    return text.translate(_TRANSLIT_TABLE)
+
+
+def create_slug(text):
+    """Создает корректный slug из текста"""
+    # Транслитерация и приведение к нижнему регистру
+    text = transliterate(text).lower()
+    
+    # Замена пробелов и специальных символов на дефисы
+    text = re.sub(r'[^a-z0-9]+', '-', text)
+    
+    # Удаление начальных и конечных дефисов
+    return text.strip('-')
+
+
+@contextmanager
+def explicit_dates(*models):
+    """Позволяет bulk_create сохранить заданные даты вместо текущего времени"""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
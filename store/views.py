@@ -1,32 +1,59 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.http import JsonResponse
-from .models import Category, Product, Order, OrderItem
+from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
+from shop import metrics
+from .models import Category, Product, Order
+from .caching import cache_catalog_page, product_detail_versions, product_list_versions
+from .cart import CartFullError, CartOperationError, apply_cart_operations, hydrate_cart
+from .checkout import CheckoutError, OutOfStockError, place_order
+from .pagination import InvalidCursor, KeysetPaginator, cached_count, get_page_size
+from .search import SearchResults
 import json
 
 # Create your views here.
 
+@cache_catalog_page(product_list_versions)
 def product_list(request, category_slug=None):
     category = None
-    categories = Category.objects.all()
-    products = Product.objects.filter(available=True)
+    products = Product.objects.for_listing().filter(available=True)
     
     if category_slug:
         category = get_object_or_404(Category, slug=category_slug)
         products = products.filter(category=category)
     
+    # Keyset-пагинация по (name, id): глубокие страницы не замедляются
+    paginator = KeysetPaginator(products, ordering=('name', 'id'), per_page=get_page_size(request))
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        raise Http404('Неверный курсор страницы')
+    
     return render(request, 'store/product_list.html', {
         'category': category,
-        'categories': categories,
-        'products': products
+        'products': page.object_list,
+        'page': page,
+        'per_page': paginator.per_page,
+        'total_count': cached_count(products)
     })
 
+@cache_catalog_page(product_detail_versions)
 def product_detail(request, id, slug):
-    product = get_object_or_404(Product, id=id, slug=slug, available=True)
-    categories = Category.objects.all()
+    product = get_object_or_404(Product.objects.for_detail(), id=id, slug=slug, available=True)
     return render(request, 'store/product_detail.html', {
-        'product': product,
-        'categories': categories
+        'product': product
+    })
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    # Результаты упорядочены по релевантности, поэтому пагинация по номеру страницы
+    paginator = Paginator(SearchResults(query), get_page_size(request))
+    page = paginator.get_page(request.GET.get('page'))
+    return render(request, 'store/search.html', {
+        'query': query,
+        'products': page.object_list,
+        'page': page,
+        'per_page': paginator.per_page,
     })
 
 def add_to_cart(request):
@@ -35,63 +62,73 @@ def add_to_cart(request):
         product_id = data.get('product_id')
         quantity = int(data.get('quantity', 1))
         
-        product = get_object_or_404(Product, id=product_id, available=True)
-        
-        cart = request.session.get('cart', {})
-        if product_id in cart:
-            cart[product_id]['quantity'] += quantity
-        else:
-            cart[product_id] = {
-                'name': product.name,
-                'price': str(product.price),
-                'quantity': quantity
-            }
+        product = get_object_or_404(Product.objects.only('id', 'name'), id=product_id, available=True)
         
-        request.session['cart'] = cart
-        request.session.modified = True
+        try:
+            request.cart.add(product.id, quantity)
+        except CartFullError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
         
         return JsonResponse({
             'success': True,
             'message': f'{product.name} добавлен в корзину',
-            'cart_count': sum(item['quantity'] for item in cart.values())
+            'cart_count': request.cart.count
         })
     
     return JsonResponse({'success': False, 'message': 'Неверный запрос'})
 
-def cart_detail(request):
-    cart = request.session.get('cart', {})
-    cart_items = []
-    total = 0
-    categories = Category.objects.all()
+def cart_batch(request):
+    """Пакетное изменение корзины: {"operations": [{"product_id", "quantity", "action"}]}"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Неверный запрос'}, status=405)
     
-    for product_id, item in cart.items():
-        product = Product.objects.get(id=product_id)
-        item_total = product.price * item['quantity']
-        cart_items.append({
-            'product': product,
-            'quantity': item['quantity'],
-            'total': item_total
-        })
-        total += item_total
+    try:
+        operations = json.loads(request.body).get('operations')
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Неверный запрос'}, status=400)
+    
+    try:
+        cart = apply_cart_operations(request.cart, operations)
+    except CartOperationError as e:
+        return JsonResponse({'success': False, 'message': str(e), 'errors': e.errors}, status=400)
+    
+    return cart_response(cart)
+
+def cart_response(cart):
+    """JSON с содержимым корзины после изменения"""
+    return JsonResponse({
+        'success': True,
+        'cart_count': cart.count,
+        'total': str(cart.total),
+        'items': [
+            {
+                'product_id': line.product.id,
+                'name': line.product.name,
+                'price': str(line.product.price),
+                'quantity': line.quantity,
+                'total': str(line.total),
+            }
+            for line in cart
+        ]
+    })
+
+def cart_detail(request):
+    cart = hydrate_cart(request.cart)
     
     return render(request, 'store/cart_detail.html', {
-        'cart_items': cart_items,
-        'total': total,
-        'categories': categories
+        'cart_items': cart.lines,
+        'total': cart.total
     })
 
 def remove_from_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    if str(product_id) in cart:
-        del cart[str(product_id)]
-        request.session['cart'] = cart
-        request.session.modified = True
+    if product_id in request.cart:
+        request.cart.remove(product_id)
         messages.success(request, 'Товар удален из корзины')
     
     return redirect('store:cart_detail')
 
 def order_create(request):
-    cart = request.session.get('cart', {})
+    cart = request.cart
     if not cart:
         messages.error(request, 'Ваша корзина пуста')
         return redirect('store:product_list')
@@ -100,7 +137,6 @@ def order_create(request):
         # Создаем заказ
         order_data = {
             'address': request.POST['address'],
-            'total_amount': 0
         }
         
         # Если пользователь авторизован, связываем заказ с ним
@@ -112,33 +148,18 @@ def order_create(request):
             order_data['customer_email'] = request.POST['customer_email']
             order_data['customer_phone'] = request.POST['customer_phone']
         
-        order = Order.objects.create(**order_data)
-        
-        total_amount = 0
-        
-        # Создаем позиции заказа
-        for product_id, item in cart.items():
-            product = Product.objects.get(id=product_id)
-            price = product.price
-            quantity = item['quantity']
-            item_total = price * quantity
-            
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                price=price,
-                quantity=quantity
-            )
-            
-            total_amount += item_total
-        
-        # Обновляем общую сумму заказа
-        order.total_amount = total_amount
-        order.save()
+        metrics.checkout_cart_lines.observe(len(cart))
+        try:
+            order = place_order(cart, **order_data)
+        except CheckoutError as e:
+            metrics.checkouts.inc(result='out_of_stock' if isinstance(e, OutOfStockError) else 'rejected')
+            messages.error(request, str(e))
+            return redirect('store:cart_detail')
+        metrics.checkouts.inc(result='success')
+        metrics.order_value.inc(float(order.total_amount))
         
         # Очищаем корзину
-        request.session['cart'] = {}
-        request.session.modified = True
+        cart.clear()
         
         # Для гостевых заказов сохраняем информацию в сессии
         if not request.user.is_authenticated:
@@ -149,24 +170,11 @@ def order_create(request):
         messages.success(request, f'Заказ #{order.id} успешно создан!')
         return redirect('store:order_success', order_id=order.id)
     
-    cart_items = []
-    total = 0
-    categories = Category.objects.all()
-    
-    for product_id, item in cart.items():
-        product = Product.objects.get(id=product_id)
-        item_total = product.price * item['quantity']
-        cart_items.append({
-            'product': product,
-            'quantity': item['quantity'],
-            'total': item_total
-        })
-        total += item_total
+    hydrated = hydrate_cart(cart)
     
     return render(request, 'store/order_create.html', {
-        'cart_items': cart_items,
-        'total': total,
-        'categories': categories
+        'cart_items': hydrated.lines,
+        'total': hydrated.total
     })
 
 def order_success(request, order_id):
@@ -174,7 +182,7 @@ def order_success(request, order_id):
     try:
         if request.user.is_authenticated:
             # Для авторизованных пользователей - только их заказы
-            order = get_object_or_404(Order, id=order_id, user=request.user)
+            order = get_object_or_404(Order.objects.select_related('user'), id=order_id, user=request.user)
         else:
             # Для гостевых заказов - проверяем через сессию
             # Создаем временный ключ для гостевых заказов
@@ -192,8 +200,6 @@ def order_success(request, order_id):
         messages.error(request, 'Заказ не найден.')
         return redirect('store:product_list')
     
-    categories = Category.objects.all()
     return render(request, 'store/order_success.html', {
-        'order': order,
-        'categories': categories
+        'order': order
     })